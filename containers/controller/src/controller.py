@@ -1,4 +1,7 @@
+import asyncio
 import logging
+import signal
+import sys
 import time
 
 import kubernetes as k8s
@@ -10,8 +13,10 @@ from controller.database import (
 )
 
 from controller.api import API
+from controller.api.aio import AsyncAPI
 from controller.directory import LDAP
-from controller.sync import sync
+from controller.kube import KubeLeaseMembers, KubeObjectCache
+from controller.sync import Reconciler, async_sync, watch_manifests
 
 
 # TODO Set logging level programmatically
@@ -21,6 +26,48 @@ logging.basicConfig(
 )
 
 
+def resync_timeout(last_resync: float, interval: int) -> float:
+
+    if last_resync is None:
+        return 0.0
+
+    return max(0.0, last_resync + interval - time.monotonic())
+
+
+async def async_main(
+    ldap: LDAP,
+    api: AsyncAPI,
+    cache: KubeObjectCache,
+    kube_namespace: str,
+    kube_resync_interval: int,
+    kube_debounce: float
+):
+
+    logging.info("Authenticate with rest api as service user")
+    async with api:
+
+        last_resync = None
+        while True:
+
+            # Wait for watch events off the event loop, any change triggers a full async
+            # sync as the event loop already multiplexes every request in it
+            changed = await asyncio.to_thread(
+                cache.wait_for_changes,
+                timeout=resync_timeout(last_resync, kube_resync_interval),
+                debounce=kube_debounce
+            )
+
+            if changed or (resync_timeout(last_resync, kube_resync_interval) <= 0):
+                await async_sync(
+                    kube_namespace=kube_namespace,
+                    manifests=cache.snapshot(),
+                    ldap=ldap,
+                    api=api
+                )
+
+                last_resync = time.monotonic()
+
+
 @click.command()
 @click.option(
     "--postgres-hostname",
@@ -85,6 +132,33 @@ logging.basicConfig(
     help="Auth password for the guacamole controller account.",
     show_default=True
 )
+@click.option(
+    "--guacamole-batch-size",
+    type=int,
+    default=100,
+    help="Number of operations to send per batch request to the guacamole api.",
+    show_default=True
+)
+@click.option(
+    "--guacamole-pool-size",
+    type=int,
+    default=10,
+    help="Maximum number of keep-alive connections to hold open to the guacamole api.",
+    show_default=True
+)
+@click.option(
+    "--guacamole-workers",
+    type=int,
+    default=8,
+    help="Number of guacamole api calls to run concurrently.",
+    show_default=True
+)
+@click.option(
+    "--guacamole-async/--no-guacamole-async",
+    default=False,
+    help="Drive the guacamole api from an asyncio event loop instead of a thread pool.",
+    show_default=True
+)
 @click.option(
     "--ldap-hostname",
     type=str,
@@ -176,6 +250,69 @@ logging.basicConfig(
     help="Number of results per page to request from the ldap server.",
     show_default=True
 )
+@click.option(
+    "--ldap-batch-size",
+    type=int,
+    default=50,
+    help="Number of member dn's resolved per ldap search when expanding groups.",
+    show_default=True
+)
+@click.option(
+    "--ldap-cache-ttl",
+    type=float,
+    default=0,
+    help="Seconds that expanded group memberships are reused across syncs, 0 reuses them only within a sync.",
+    show_default=True
+)
+@click.option(
+    "--ldap-incremental-attribute",
+    type=click.Choice(["modifyTimestamp", "uSNChanged"]),
+    default=None,
+    help="Keep expanded group memberships between syncs, only refreshing groups and users changed since the last sync according to this attribute.",
+    show_default=True
+)
+@click.option(
+    "--ldap-full-rescan-interval",
+    type=float,
+    default=3600,
+    help="Seconds between rebuilding every group membership from scratch when syncing incrementally.",
+    show_default=True
+)
+@click.option(
+    "--ldap-dn-cache-ttl",
+    type=float,
+    default=3600,
+    help="Seconds that member dn's are remembered as users, groups or neither, so each is only searched for where it can be found.",
+    show_default=True
+)
+@click.option(
+    "--ldap-attribute-cache-size",
+    type=int,
+    default=100000,
+    help="Number of users whose attributes are kept between syncs, only fetched again once their entry changes.",
+    show_default=True
+)
+@click.option(
+    "--ldap-pool-size",
+    type=int,
+    default=4,
+    help="Number of bound ldap connections, and so of manifests whose groups are expanded at once.",
+    show_default=True
+)
+@click.option(
+    "--ldap-processes",
+    type=int,
+    default=0,
+    help="Number of worker processes expanding groups across cores, 0 expands them on threads in the controller process. Ignored with the snapshot strategy or incremental syncs.",
+    show_default=True
+)
+@click.option(
+    "--ldap-expansion-strategy",
+    type=click.Choice(["recursive", "in-chain", "member-of", "snapshot"]),
+    default="recursive",
+    help="How nested groups are expanded, walking members, searching users by memberOf in chain (Active Directory) or through a memberOf overlay (OpenLDAP), or scanning every group and user once per sync.",
+    show_default=True
+)
 @click.option(
     "--kube-namespace",
     type=str,
@@ -183,6 +320,109 @@ logging.basicConfig(
     help="Namespace for looking for Guacamole CRD instances.",
     show_default=True
 )
+@click.option(
+    "--kube-all-namespaces/--no-kube-all-namespaces",
+    default=False,
+    help="Watch GuacamoleConnections in every namespace rather than only --kube-namespace.",
+    show_default=True
+)
+@click.option(
+    "--kube-namespaces",
+    type=str,
+    multiple=True,
+    help="Namespaces to watch for GuacamoleConnections instead of only --kube-namespace.",
+    show_default=True
+)
+@click.option(
+    "--kube-label-selector",
+    type=str,
+    default=None,
+    help="Label selector restricting which GuacamoleConnections are watched.",
+    show_default=True
+)
+@click.option(
+    "--kube-page-size",
+    type=int,
+    default=500,
+    help="Maximum number of manifests fetched per page when listing from kubes.",
+    show_default=True
+)
+@click.option(
+    "--kube-resync-interval",
+    type=int,
+    default=300,
+    help="Seconds between full syncs of every manifest, in addition to syncs triggered by watch events.",
+    show_default=True
+)
+@click.option(
+    "--kube-debounce",
+    type=float,
+    default=2.0,
+    help="Seconds to wait for a burst of watch events to settle before syncing the changed manifests.",
+    show_default=True
+)
+@click.option(
+    "--kube-shard/--no-kube-shard",
+    default=False,
+    help="Share the manifests between controller replicas coordinating through kubes leases.",
+    show_default=True
+)
+@click.option(
+    "--kube-pod-name",
+    type=str,
+    default=None,
+    help="Identity of this replica in the leases, usually the pod name.",
+    show_default=True
+)
+@click.option(
+    "--kube-lease-name",
+    type=str,
+    default="guacamole-controller",
+    help="Prefix of the leases shared by the controller replicas in --kube-namespace.",
+    show_default=True
+)
+@click.option(
+    "--kube-lease-duration",
+    type=int,
+    default=30,
+    help="Seconds after its last renewal that a replica's leases expire.",
+    show_default=True
+)
+@click.option(
+    "--kube-lease-renew-interval",
+    type=float,
+    default=10.0,
+    help="Seconds between renewals of this replica's leases.",
+    show_default=True
+)
+@click.option(
+    "--reconcile-workers",
+    type=int,
+    default=4,
+    help="Number of manifests reconciled concurrently.",
+    show_default=True
+)
+@click.option(
+    "--reconcile-backoff",
+    type=float,
+    default=1.0,
+    help="Seconds before the first retry of a manifest that failed to reconcile, doubling on each failure.",
+    show_default=True
+)
+@click.option(
+    "--reconcile-max-backoff",
+    type=float,
+    default=300.0,
+    help="Maximum seconds between retries of a manifest that keeps failing to reconcile.",
+    show_default=True
+)
+@click.option(
+    "--kube-status-interval",
+    type=float,
+    default=5.0,
+    help="Seconds between batched writes of manifest statuses.",
+    show_default=True
+)
 def main(
     postgres_hostname: str,
     postgres_port: int,
@@ -193,6 +433,10 @@ def main(
     guacamole_port: int,
     guacamole_username: str,
     guacamole_password: str,
+    guacamole_batch_size: int,
+    guacamole_pool_size: int,
+    guacamole_workers: int,
+    guacamole_async: bool,
     ldap_hostname: str,
     ldap_port: int,
     ldap_user_base_dn: str,
@@ -206,7 +450,31 @@ def main(
     ldap_search_bind_dn: str,
     ldap_search_bind_password: str,
     ldap_paged_size: int,
-    kube_namespace: str
+    ldap_batch_size: int,
+    ldap_cache_ttl: float,
+    ldap_incremental_attribute: str,
+    ldap_full_rescan_interval: float,
+    ldap_dn_cache_ttl: float,
+    ldap_attribute_cache_size: int,
+    ldap_pool_size: int,
+    ldap_processes: int,
+    ldap_expansion_strategy: str,
+    kube_namespace: str,
+    kube_all_namespaces: bool,
+    kube_namespaces: tuple,
+    kube_label_selector: str,
+    kube_page_size: int,
+    kube_resync_interval: int,
+    kube_debounce: float,
+    kube_shard: bool,
+    kube_pod_name: str,
+    kube_lease_name: str,
+    kube_lease_duration: int,
+    kube_lease_renew_interval: float,
+    reconcile_workers: int,
+    reconcile_backoff: float,
+    reconcile_max_backoff: float,
+    kube_status_interval: float
 ):
     logging.info(f"running {__file__}")
 
@@ -226,14 +494,30 @@ def main(
             password=guacamole_password
         )
 
-    logging.info("Authenticate with rest api as service user")
-    api = API(
-        hostname=guacamole_hostname,
-        port=guacamole_port,
-        username=guacamole_username,
-        password=guacamole_password,
-        data_source="postgresql"
-    )
+    if guacamole_async:
+        # Authenticates once the event loop is running
+        api = AsyncAPI(
+            hostname=guacamole_hostname,
+            port=guacamole_port,
+            username=guacamole_username,
+            password=guacamole_password,
+            data_source="postgresql",
+            batch_size=guacamole_batch_size,
+            pool_size=guacamole_pool_size
+        )
+
+    else:
+        logging.info("Authenticate with rest api as service user")
+        api = API(
+            hostname=guacamole_hostname,
+            port=guacamole_port,
+            username=guacamole_username,
+            password=guacamole_password,
+            data_source="postgresql",
+            batch_size=guacamole_batch_size,
+            pool_size=guacamole_pool_size,
+            workers=guacamole_workers
+        )
 
     logging.info("Authenticate with ldap as search bind")
     ldap = LDAP(
@@ -250,19 +534,101 @@ def main(
         group_filter=ldap_group_search_filter,
         member_attribute=ldap_member_attribute,
         paged_size=ldap_paged_size,
+        batch_size=ldap_batch_size,
+        cache_ttl=ldap_cache_ttl,
+        incremental_attribute=ldap_incremental_attribute,
+        full_rescan_interval=ldap_full_rescan_interval,
+        expansion_strategy=ldap_expansion_strategy,
+        dn_cache_ttl=ldap_dn_cache_ttl,
+        attribute_cache_size=ldap_attribute_cache_size,
+        pool_size=ldap_pool_size,
+        processes=ldap_processes,
     )
 
     logging.info("Load kube config")
     k8s.config.load_incluster_config()
 
-    while True:
-        sync(
+    logging.info("Watch kube manifests")
+    cache = watch_manifests(
+        namespaces=None if kube_all_namespaces else (list(kube_namespaces) or [kube_namespace]),
+        label_selector=kube_label_selector,
+        limit=kube_page_size
+    )
+
+    # The async mode runs full syncs from one process, so it cannot share manifests
+    if guacamole_async and kube_shard:
+        ex = ValueError(("Sharding is not supported with the async guacamole api!", guacamole_async, kube_shard))
+        logging.exception("Sharding is not supported with the async guacamole api!", exc_info=ex)
+        raise ex
+
+    if guacamole_async:
+        asyncio.run(async_main(
             kube_namespace=kube_namespace,
+            kube_resync_interval=kube_resync_interval,
+            kube_debounce=kube_debounce,
+            cache=cache,
             ldap=ldap,
             api=api
+        ))
+
+    members = None
+    if kube_shard:
+
+        if not kube_pod_name:
+            ex = ValueError(("Sharding requires a pod name!", kube_pod_name))
+            logging.exception("Sharding requires a pod name!", exc_info=ex)
+            raise ex
+
+        logging.info(f"Join controller replicas as {kube_pod_name=}")
+        members = KubeLeaseMembers(
+            namespace=kube_namespace,
+            name=kube_lease_name,
+            identity=kube_pod_name,
+            lease_duration=kube_lease_duration,
+            renew_interval=kube_lease_renew_interval
         )
+        members.start()
+
+    logging.info("Start reconcilers")
+    reconciler = Reconciler(
+        ldap=ldap,
+        api=api,
+        cache=cache,
+        members=members,
+        workers=reconcile_workers,
+        base_delay=reconcile_backoff,
+        max_delay=reconcile_max_backoff,
+        status_interval=kube_status_interval
+    )
+    reconciler.start()
+
+    # Pods are stopped with SIGTERM, exit through the finally block so this replica leaves its shard
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    last_resync = None
+    try:
+        while True:
+
+            # Wait for watch events until the next full resync is due
+            changed = cache.wait_for_changes(
+                timeout=resync_timeout(last_resync, kube_resync_interval),
+                debounce=kube_debounce
+            )
+
+            # Changed manifests are queued ahead of any resync still waiting to be reconciled
+            reconciler.enqueue(changed, priority=True)
+
+            if resync_timeout(last_resync, kube_resync_interval) <= 0:
+                reconciler.resync()
+                last_resync = time.monotonic()
+
+    finally:
+        if members is not None:
+            try:
+                members.stop()
 
-        time.sleep(30)
+            except Exception as ex:
+                logging.exception("Failed to release leases!", exc_info=ex)
 
     logging.info("Halting")
 
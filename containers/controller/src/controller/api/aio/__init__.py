@@ -0,0 +1 @@
+from .wrapper import AsyncAPI
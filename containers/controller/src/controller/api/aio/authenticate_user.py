@@ -0,0 +1,30 @@
+import json
+import logging
+
+import aiohttp
+
+
+async def aio_authenticate_user(
+    session: aiohttp.ClientSession,
+    url: str,
+    username: str,
+    password: str
+) -> str:
+
+    logging.info("authenticating user")
+    async with session.post(
+        f"{url}/api/tokens",
+        data=dict(
+            username=username,
+            password=password
+        ),
+        headers={"Content-Type": "application/x-www-form-urlencoded"}
+    ) as response:
+        response = json.loads(await response.text())
+
+    logging.debug(f"{response=}")
+
+    token = response['authToken']
+    logging.debug(f"{token=}")
+
+    return token
@@ -0,0 +1,175 @@
+import json
+import logging
+from urllib.parse import quote
+
+import aiohttp
+
+from ..error import APIConnectionDoesNotExistError
+
+
+async def aio_list_connections(
+    session: aiohttp.ClientSession,
+    url: str,
+    token: str
+) -> dict:
+
+    logging.debug("List connections")
+    async with session.get(
+        f"{url}/connections",
+        params=dict(token=token)
+    ) as response:
+        status, text = response.status, await response.text()
+
+    if status not in (200,):
+        ex = RuntimeError(("Bad status code!", status, text))
+        logging.exception("Bad status code!", exc_info=ex)
+        raise ex
+
+    response = json.loads(text)
+    logging.debug(f"{response=}")
+    return response
+
+
+async def aio_get_connection(
+    session: aiohttp.ClientSession,
+    url: str,
+    token: str,
+    conn_id: int
+) -> dict:
+
+    logging.debug(f"Get connection {conn_id=}")
+    async with session.get(
+        f"{url}/connections/{quote(str(conn_id))}",
+        params=dict(token=token)
+    ) as response:
+        status, text = response.status, await response.text()
+
+    if status not in (200,):
+        # TODO this exception catches too much
+        ex = APIConnectionDoesNotExistError(("Bad status code!", status, text))
+        logging.exception("Bad status code!", exc_info=ex)
+        raise ex
+
+    response = json.loads(text)
+    logging.debug(f"{response=}")
+    return response
+
+
+async def aio_get_connection_parameters(
+    session: aiohttp.ClientSession,
+    url: str,
+    token: str,
+    conn_id: int
+) -> dict:
+
+    logging.debug(f"Get connection parameters {conn_id=}")
+    async with session.get(
+        f"{url}/connections/{quote(str(conn_id))}/parameters",
+        params=dict(token=token)
+    ) as response:
+        status, text = response.status, await response.text()
+
+    if status not in (200,):
+        # TODO this exception catches too much
+        ex = APIConnectionDoesNotExistError(("Bad status code!", status, text))
+        logging.exception("Bad status code!", exc_info=ex)
+        raise ex
+
+    response = json.loads(text)
+    logging.debug(f"{response=}")
+    return response
+
+
+async def aio_create_connection(
+    session: aiohttp.ClientSession,
+    url: str,
+    token: str,
+    conn_name: str,
+    conn_protocol: str,
+    conn_parent: str,
+    conn_parameters: dict,
+    conn_attributes: dict
+) -> dict:
+
+    logging.debug(f"Creating connection {conn_name=}")
+    async with session.post(
+        f"{url}/connections",
+        params=dict(token=token),
+        data=json.dumps(dict(
+            parentIdentifier=conn_parent,
+            name=conn_name,
+            protocol=conn_protocol,
+            parameters=conn_parameters,
+            attributes=conn_attributes
+        ))
+    ) as response:
+        status, text = response.status, await response.text()
+
+    if status not in (200,):
+        ex = RuntimeError(("Bad status code!", status, text))
+        logging.exception("Bad status code!", exc_info=ex)
+        raise ex
+
+    response = json.loads(text)
+    logging.debug(f"{response=}")
+    return response
+
+
+async def aio_update_connection(
+    session: aiohttp.ClientSession,
+    url: str,
+    token: str,
+    conn_id: int,
+    conn_name: str,
+    conn_protocol: str,
+    conn_parent: str,
+    conn_parameters: dict,
+    conn_attributes: dict
+):
+
+    logging.debug(f"Updating connection {conn_name=} {conn_id=}")
+    async with session.put(
+        f"{url}/connections/{quote(str(conn_id))}",
+        params=dict(token=token),
+        data=json.dumps(dict(
+            identifier=str(conn_id),
+            name=conn_name,
+            parentIdentifier=conn_parent,
+            protocol=conn_protocol,
+            parameters=conn_parameters,
+            attributes=conn_attributes
+        ))
+    ) as response:
+        status, text = response.status, await response.text()
+
+    if status in (500,):
+        ex = RuntimeError(("Bad status code!", status, text))
+        logging.exception("Bad status code!", exc_info=ex)
+        raise ex
+
+    if status not in (204,):
+        # TODO this exception catches too much
+        ex = APIConnectionDoesNotExistError(("Bad status code!", status, text))
+        logging.exception("Bad status code!", exc_info=ex)
+        raise ex
+
+
+async def aio_delete_connection(
+    session: aiohttp.ClientSession,
+    url: str,
+    token: str,
+    conn_id: int
+):
+
+    logging.debug(f"Delete connection {conn_id=}")
+    async with session.delete(
+        f"{url}/connections/{quote(str(conn_id))}",
+        params=dict(token=token)
+    ) as response:
+        status, text = response.status, await response.text()
+
+    if status not in (204,):
+        # TODO this exception catches too much
+        ex = APIConnectionDoesNotExistError(("Bad status code!", status, text))
+        logging.exception("Bad status code!", exc_info=ex)
+        raise ex
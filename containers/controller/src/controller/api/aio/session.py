@@ -0,0 +1,17 @@
+import aiohttp
+
+
+def aio_session(
+    pool_size: int
+) -> aiohttp.ClientSession:
+
+    # Requests beyond pool_size wait for a free keep-alive connection rather than
+    # opening another one, so any number can be in flight on the one event loop
+    connector = aiohttp.TCPConnector(limit=pool_size, ssl=False)
+
+    return aiohttp.ClientSession(
+        connector=connector,
+        # Time spent queued for a pooled connection isn't counted, only connecting and reading
+        timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=30),
+        headers={"Content-Type": "application/json"}
+    )
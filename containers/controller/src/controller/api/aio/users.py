@@ -0,0 +1,137 @@
+import json
+import logging
+from urllib.parse import quote
+
+import aiohttp
+
+from ..error import APIPatchError, APIUserDoesNotExistError
+from ..users.patch_failures import api_patch_failures
+
+
+async def aio_list_users(
+    session: aiohttp.ClientSession,
+    url: str,
+    token: str
+) -> dict:
+
+    logging.debug("List users")
+    async with session.get(
+        f"{url}/users",
+        params=dict(token=token)
+    ) as response:
+        status, text = response.status, await response.text()
+
+    if status not in (200,):
+        ex = RuntimeError(("Bad status code!", status, text))
+        logging.exception("Bad status code!", exc_info=ex)
+        raise ex
+
+    response = json.loads(text)
+    logging.debug(f"{response=}")
+    return response
+
+
+async def aio_get_user(
+    session: aiohttp.ClientSession,
+    url: str,
+    token: str,
+    username: str
+) -> dict:
+
+    logging.debug(f"Get user {username=}")
+    async with session.get(
+        f"{url}/users/{quote(username)}",
+        params=dict(token=token)
+    ) as response:
+        status, text = response.status, await response.text()
+
+    if status not in (200,):
+        # TODO this exception catches too much
+        ex = APIUserDoesNotExistError(("Bad status code!", status, text))
+        logging.exception("Bad status code!", exc_info=ex)
+        raise ex
+
+    response = json.loads(text)
+    logging.debug(f"{response=}")
+    return response
+
+
+async def aio_get_user_effective_permissions(
+    session: aiohttp.ClientSession,
+    url: str,
+    token: str,
+    username: str
+) -> dict:
+
+    logging.debug(f"Get user effective permissions {username=}")
+    async with session.get(
+        f"{url}/users/{quote(username)}/effectivePermissions",
+        params=dict(token=token)
+    ) as response:
+        status, text = response.status, await response.text()
+
+    if status not in (200,):
+        # TODO this exception catches too much
+        ex = APIUserDoesNotExistError(("Bad status code!", status, text))
+        logging.exception("Bad status code!", exc_info=ex)
+        raise ex
+
+    response = json.loads(text)
+    logging.debug(f"{response=}")
+    return response
+
+
+async def aio_patch_users(
+    session: aiohttp.ClientSession,
+    url: str,
+    token: str,
+    patches: list
+) -> dict:
+
+    logging.debug(f"Patching users {len(patches)=}")
+    async with session.patch(
+        f"{url}/users",
+        params=dict(token=token),
+        data=json.dumps(patches)
+    ) as response:
+        status, text = response.status, await response.text()
+
+    if status not in (200, 204):
+
+        failures = api_patch_failures(patches=patches, text=text)
+
+        ex = APIPatchError(("Bad status code!", status, text), failures=failures)
+        logging.exception("Bad status code!", exc_info=ex)
+        raise ex
+
+    if not text:
+        return dict()
+
+    response = json.loads(text)
+    logging.debug(f"{response=}")
+    return response
+
+
+async def aio_patch_user_permissions(
+    session: aiohttp.ClientSession,
+    url: str,
+    token: str,
+    username: str,
+    patches: list
+):
+
+    logging.debug(f"Patching user permissions {username=} {len(patches)=}")
+    async with session.patch(
+        f"{url}/users/{quote(username)}/permissions",
+        params=dict(token=token),
+        data=json.dumps(patches)
+    ) as response:
+        status, text = response.status, await response.text()
+
+    if status not in (204,):
+        ex = APIPatchError(
+            ("Bad status code!", status, text),
+            failures=[dict(patch, username=username, error=text) for patch in patches]
+        )
+        logging.exception("Bad status code!", exc_info=ex)
+        raise ex
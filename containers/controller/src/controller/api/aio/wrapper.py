@@ -0,0 +1,623 @@
+import asyncio
+import logging
+import typing
+from collections import Counter, defaultdict
+from urllib.parse import quote
+
+import aiohttp
+
+from ..build_url import build_url
+from ..connections.diff import (
+    build_connection_attributes,
+    build_connection_parameters,
+    connection_needs_update
+)
+from ..error import APIConnectionDoesNotExistError, APIPatchError, APIUserDoesNotExistError
+from ..users.build_patches import (
+    build_permission_patches,
+    build_user_add_patches,
+    build_user_remove_patches,
+    build_user_replace_patches,
+    chunk_patches
+)
+from ..users.diff import build_user_attributes, user_needs_update
+from ..users.patch_failures import api_patch_remaining
+from .authenticate_user import aio_authenticate_user
+from .connections import (
+    aio_create_connection,
+    aio_delete_connection,
+    aio_get_connection,
+    aio_get_connection_parameters,
+    aio_list_connections,
+    aio_update_connection
+)
+from .session import aio_session
+from .users import (
+    aio_get_user,
+    aio_get_user_effective_permissions,
+    aio_list_users,
+    aio_patch_user_permissions,
+    aio_patch_users
+)
+
+
+class AsyncAPI:
+
+    hostname: str
+    port: int
+    username: str
+    password: str
+    data_source: str
+    batch_size: int
+    pool_size: int
+    session: aiohttp.ClientSession
+    url: str
+    data_url: str
+    token: str
+    connections_by_name: dict
+    stats: Counter
+    errors: list
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: str,
+        password: str,
+        data_source: str,
+        batch_size: int = 100,
+        pool_size: int = 100
+    ):
+
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.data_source = data_source
+        self.batch_size = batch_size
+        self.pool_size = pool_size
+
+        self.url = build_url(scheme="http", netloc=f"{hostname}:{port}")
+        self.data_url = f"{self.url}/api/session/data/{quote(data_source)}"
+
+        # The session is bound to the running event loop, so it is opened by
+        # authenticate() rather than here
+        self.session = None
+        self.token = None
+
+        self.connections_by_name = None
+
+        self.stats = Counter()
+        self.errors = list()
+
+    async def __aenter__(self):
+        await self.authenticate()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def authenticate(self):
+
+        if self.session is None:
+            self.session = aio_session(pool_size=self.pool_size)
+
+        self.token = await aio_authenticate_user(
+            session=self.session,
+            url=self.url,
+            username=self.username,
+            password=self.password
+        )
+
+    async def close(self):
+
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def count(self, key: str, value: int = 1):
+        self.stats[key] += value
+
+    def clear_stats(self):
+        self.stats.clear()
+        self.errors.clear()
+
+    async def run_concurrently(
+        self,
+        fn: typing.Callable[..., typing.Awaitable],
+        items: typing.Iterable
+    ) -> list:
+
+        # Every call is in flight at once on the event loop, the session's connector
+        # bounds how many hit the api at the same time. Failures are logged and
+        # collected for the cycle, failed items return None
+        results = await asyncio.gather(*map(fn, items), return_exceptions=True)
+
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                logging.exception("Concurrent api call failed!", exc_info=result)
+                self.errors.append(result)
+                results[index] = None
+
+        return results
+
+    async def list_users(self):
+        return await aio_list_users(
+            session=self.session,
+            url=self.data_url,
+            token=self.token
+        )
+
+    async def get_user(self, username: str):
+        return await aio_get_user(
+            session=self.session,
+            url=self.data_url,
+            token=self.token,
+            username=username
+        )
+
+    async def get_user_effective_permissions(self, username: str):
+        return await aio_get_user_effective_permissions(
+            session=self.session,
+            url=self.data_url,
+            token=self.token,
+            username=username
+        )
+
+    async def patch_users(self, patches: list):
+
+        async def patch_chunk(chunk: list):
+            try:
+                await aio_patch_users(
+                    session=self.session,
+                    url=self.data_url,
+                    token=self.token,
+                    patches=chunk
+                )
+                return len(chunk), list()
+
+            except APIPatchError as ex:
+                failures = ex.failures
+
+            # A rejected chunk applies none of its operations, so resend it once as a single
+            # batch without the operations that were at fault
+            remaining = api_patch_remaining(patches=chunk, failures=failures)
+            if not remaining or (len(remaining) == len(chunk)):
+                return 0, failures
+
+            try:
+                await aio_patch_users(
+                    session=self.session,
+                    url=self.data_url,
+                    token=self.token,
+                    patches=remaining
+                )
+                return len(remaining), failures
+
+            except APIPatchError as ex:
+                return 0, failures + ex.failures
+
+        # Send the operations in concurrent chunks, each chunk is applied or rejected as a whole
+        chunks = chunk_patches(patches=patches, batch_size=self.batch_size)
+
+        applied = 0
+        failures = list()
+        for chunk, result in zip(chunks, await self.run_concurrently(patch_chunk, chunks)):
+
+            # A chunk that raised rather than being rejected counts every operation in it as failed
+            if result is None:
+                failures.extend(chunk)
+                continue
+
+            applied += result[0]
+            failures.extend(result[1])
+
+        for failure in failures:
+            logging.error(f"Failed to patch user {failure=}")
+
+        return applied, failures
+
+    async def create_users(
+        self,
+        users: list,
+        organization: str,
+        role: str
+    ):
+
+        if any((self.username == user["username"]) for user in users):
+            raise ValueError(("Trying to create user with same name as service account!", self.username))
+
+        logging.info(f"Creating {len(users)} users")
+        applied, failures = await self.patch_users(patches=build_user_add_patches(
+            users=users,
+            organization=organization,
+            role=role
+        ))
+
+        self.count("users_created", applied)
+        self.count("users_failed", len(failures))
+        return failures
+
+    async def update_users(
+        self,
+        users: list,
+        organization: str,
+        role: str
+    ):
+
+        if any((self.username == user["username"]) for user in users):
+            raise ValueError(("Trying to update user with same name as service account!", self.username))
+
+        logging.info(f"Updating {len(users)} users")
+        applied, failures = await self.patch_users(patches=build_user_replace_patches(
+            users=users,
+            organization=organization,
+            role=role
+        ))
+
+        self.count("users_updated", applied)
+        self.count("users_failed", len(failures))
+        return failures
+
+    async def delete_users(self, usernames: list):
+
+        if self.username in usernames:
+            raise ValueError(("Trying to delete user with same name as service account!", self.username))
+
+        logging.info(f"Deleting {len(usernames)} users")
+        applied, failures = await self.patch_users(patches=build_user_remove_patches(usernames=usernames))
+
+        self.count("users_deleted", applied)
+        self.count("users_failed", len(failures))
+        return failures
+
+    async def create_or_update_user(
+        self,
+        username: str,
+        fullname: str,
+        email: str,
+        organization: str,
+        role: str
+    ):
+
+        user = dict(username=username, fullname=fullname, email=email)
+
+        try:
+            observed_user = await self.get_user(username=username)
+
+            needs_update = user_needs_update(
+                observed_user=observed_user,
+                attributes=build_user_attributes(
+                    fullname=fullname,
+                    email=email,
+                    organization=organization,
+                    role=role
+                )
+            )
+
+            if needs_update:
+                failures = await self.update_users(users=[user], organization=organization, role=role)
+            else:
+                failures = list()
+
+        except APIUserDoesNotExistError:
+            failures = await self.create_users(users=[user], organization=organization, role=role)
+
+        if failures:
+            raise APIPatchError(("Failed to create or update user!", username), failures=failures)
+
+    async def delete_user(self, username: str):
+
+        failures = await self.delete_users(usernames=[username])
+
+        if failures:
+            raise APIPatchError(("Failed to delete user!", username), failures=failures)
+
+    async def list_connections(self):
+        connections = await aio_list_connections(
+            session=self.session,
+            url=self.data_url,
+            token=self.token
+        )
+
+        self.connections_by_name = {
+            connection["name"]: connection
+            for connection in connections.values()
+        }
+
+        return connections
+
+    async def get_connection_id(self, conn_name: str, conn_id: str = None):
+
+        connection = (self.connections_by_name or dict()).get(conn_name)
+
+        if connection is not None:
+            return connection["identifier"]
+
+        # Try the identifier recorded on the manifest status, which saves listing every
+        # connection straight after a restart and finds connections missing from the index
+        if conn_id is not None:
+            try:
+                connection = await self.get_connection(conn_id=conn_id)
+
+                if connection["name"] == conn_name:
+                    if self.connections_by_name is not None:
+                        self.connections_by_name[conn_name] = connection
+
+                    return connection["identifier"]
+
+            except APIConnectionDoesNotExistError:
+                pass
+
+        # The index may be stale, check a fresh listing before the caller creates a
+        # connection that would duplicate the name
+        await self.list_connections()
+
+        connection = self.connections_by_name.get(conn_name)
+
+        if connection is None:
+            raise APIConnectionDoesNotExistError(("Connection does not exist!", conn_name))
+
+        return connection["identifier"]
+
+    async def get_connection(self, conn_id: int):
+        return await aio_get_connection(
+            session=self.session,
+            url=self.data_url,
+            token=self.token,
+            conn_id=conn_id
+        )
+
+    async def get_connection_parameters(self, conn_id: int):
+        return await aio_get_connection_parameters(
+            session=self.session,
+            url=self.data_url,
+            token=self.token,
+            conn_id=conn_id
+        )
+
+    async def create_connection(
+        self,
+        name: str,
+        protocol: str,
+        parent: str,
+        hostname: str,
+        port: int
+    ):
+
+        logging.info(f"Creating connection {name=}")
+        response = await aio_create_connection(
+            session=self.session,
+            url=self.data_url,
+            token=self.token,
+            conn_name=name,
+            conn_protocol=protocol,
+            conn_parent=parent,
+            conn_parameters=build_connection_parameters(
+                hostname=hostname,
+                port=port
+            ),
+            conn_attributes=build_connection_attributes()
+        )
+
+        if self.connections_by_name is not None:
+            self.connections_by_name[name] = response
+
+        return response["identifier"]
+
+    async def update_connection(
+        self,
+        conn_id: int,
+        name: str,
+        protocol: str,
+        parent: str,
+        hostname: str,
+        port: int
+    ):
+        logging.info(f"Updating connection {name=} {conn_id=}")
+        await aio_update_connection(
+            session=self.session,
+            url=self.data_url,
+            token=self.token,
+            conn_id=conn_id,
+            conn_name=name,
+            conn_protocol=protocol,
+            conn_parent=parent,
+            conn_parameters=build_connection_parameters(
+                hostname=hostname,
+                port=port
+            ),
+            conn_attributes=build_connection_attributes()
+        )
+
+        if self.connections_by_name is not None:
+            self.connections_by_name[name] = dict(
+                self.connections_by_name.get(name, dict()),
+                identifier=str(conn_id),
+                name=name,
+                protocol=protocol,
+                parentIdentifier=parent,
+                attributes=build_connection_attributes()
+            )
+
+    async def create_or_update_connection(
+        self,
+        name: str,
+        protocol: str,
+        parent: str,
+        hostname: str,
+        port: int,
+        conn_id: str = None
+    ):
+
+        try:
+            conn_id = await self.get_connection_id(conn_name=name, conn_id=conn_id)
+
+            if self.connections_by_name is not None and name in self.connections_by_name:
+                connection = self.connections_by_name[name]
+            else:
+                connection = await self.get_connection(conn_id=conn_id)
+
+            connection_parameters = await self.get_connection_parameters(conn_id=conn_id)
+
+            needs_update = connection_needs_update(
+                observed_connection=connection,
+                observed_parameters=connection_parameters,
+                name=name,
+                protocol=protocol,
+                parent=parent,
+                parameters=build_connection_parameters(
+                    hostname=hostname,
+                    port=port
+                ),
+                attributes=build_connection_attributes()
+            )
+
+            if needs_update:
+
+                await self.update_connection(
+                    conn_id=conn_id,
+                    name=name,
+                    protocol=protocol,
+                    parent=parent,
+                    hostname=hostname,
+                    port=port
+                )
+
+                self.count("connections_updated")
+
+            else:
+                logging.debug(f"Skipping updating connection {name=}")
+                self.count("connections_unchanged")
+
+            return conn_id
+
+        except APIConnectionDoesNotExistError:
+
+            conn_id = await self.create_connection(
+                name=name,
+                protocol=protocol,
+                parent=parent,
+                hostname=hostname,
+                port=port
+            )
+
+            # Only counted once the create has succeeded
+            self.count("connections_created")
+
+            return conn_id
+
+    async def delete_connection(self, conn_id: int):
+        logging.info(f"Delete connection {conn_id=}")
+        await aio_delete_connection(
+            session=self.session,
+            url=self.data_url,
+            token=self.token,
+            conn_id=conn_id
+        )
+
+        if self.connections_by_name is not None:
+            self.connections_by_name = {
+                name: connection
+                for name, connection in self.connections_by_name.items()
+                if str(connection["identifier"]) != str(conn_id)
+            }
+
+    async def update_user_connections(
+        self,
+        username: str,
+        grant_conn_ids: typing.Iterable[str] = (),
+        revoke_conn_ids: typing.Iterable[str] = ()
+    ):
+
+        patches = build_permission_patches(
+            grant_conn_ids=grant_conn_ids,
+            revoke_conn_ids=revoke_conn_ids
+        )
+
+        logging.info(f"Update user connections {username=} {len(patches)=}")
+
+        failures = list()
+        for chunk in chunk_patches(patches=patches, batch_size=self.batch_size):
+
+            try:
+                await aio_patch_user_permissions(
+                    session=self.session,
+                    url=self.data_url,
+                    token=self.token,
+                    username=username,
+                    patches=chunk
+                )
+
+                self.count("permissions_granted", sum((patch["op"] == "add") for patch in chunk))
+                self.count("permissions_revoked", sum((patch["op"] == "remove") for patch in chunk))
+
+            except APIPatchError as ex:
+                failures.extend(ex.failures)
+
+        for failure in failures:
+            logging.error(f"Failed to patch user permission {failure=}")
+
+        self.count("permissions_failed", len(failures))
+        return failures
+
+    async def create_user_connection(
+        self,
+        username: str,
+        conn_id: int,
+    ):
+        failures = await self.update_user_connections(username=username, grant_conn_ids=[conn_id])
+
+        if failures:
+            raise APIUserDoesNotExistError(("Failed to create user connection!", username, conn_id, failures))
+
+    async def delete_user_connection(
+        self,
+        username: str,
+        conn_id: int,
+    ):
+        failures = await self.update_user_connections(username=username, revoke_conn_ids=[conn_id])
+
+        if failures:
+            raise APIUserDoesNotExistError(("Failed to delete user connection!", username, conn_id, failures))
+
+    async def list_users_by_connection(self, users: dict = None):
+
+        if users is None:
+            users = await self.list_users()
+
+        # Fetch each user's permissions at most once and invert them into an index of
+        # connection identifier -> usernames with READ access to that connection
+        usernames = [user["username"] for user in users.values()]
+
+        permissions_by_user = await self.run_concurrently(
+            lambda username: self.get_user_effective_permissions(username=username),
+            usernames
+        )
+
+        users_by_connection = defaultdict(set)
+        for username, permissions in zip(usernames, permissions_by_user):
+
+            if permissions is None:
+                continue
+
+            for conn_id, conn_permissions in permissions["connectionPermissions"].items():
+                if "READ" in conn_permissions:
+                    users_by_connection[str(conn_id)].add(username)
+
+        return dict(users_by_connection)
+
+    async def list_connection_users(
+        self,
+        conn_id: int
+    ):
+
+        users = await self.list_users()
+
+        users_by_connection = await self.list_users_by_connection(users=users)
+
+        return {
+            user["username"]: user
+            for user in users.values()
+            if user["username"] in users_by_connection.get(str(conn_id), set())
+        }
@@ -3,6 +3,13 @@ from collections import namedtuple
 from urllib.parse import urlencode, urlunparse
 
 
+# namedtuple to match the internal signature of urlunparse
+Components = namedtuple(
+    typename='Components',
+    field_names=['scheme', 'netloc', 'path', 'params', 'query', 'fragment']
+)
+
+
 def build_url(
     scheme: str,
     netloc: str,
@@ -15,12 +22,6 @@ def build_url(
     if query is None:
         query = dict()
 
-    # namedtuple to match the internal signature of urlunparse
-    Components = namedtuple(
-        typename='Components',
-        field_names=['scheme', 'netloc', 'path', 'params', 'query', 'fragment']
-    )
-
     url = urlunparse(
         Components(
             scheme=scheme,
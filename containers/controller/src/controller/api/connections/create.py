@@ -90,50 +90,31 @@
 
 import json
 import logging
-from urllib.parse import quote
 
 import requests
 
-from ..build_url import build_url
-
 
 def api_create_connection(
-    hostname: str,
-    port: int,
-    token: str,
-    data_source: str,
+    session: requests.Session,
+    url: str,
     conn_name: str,
     conn_protocol: str,
     conn_parent: str,
-    conn_hostname: str,
-    conn_port: int
+    conn_parameters: dict,
+    conn_attributes: dict
 ) -> dict:
 
     logging.debug(f"Creating connection {conn_name=}")
-    response = requests.post(
-        build_url(
-            scheme="http",
-            netloc=f"{hostname}:{port}",
-            path=f"/api/session/data/{quote(data_source)}/connections",
-            query=dict(
-                token=token
-            )
-        ),
+    response = session.post(
+        f"{url}/connections",
         data=json.dumps(dict(
             parentIdentifier=conn_parent,
             name=conn_name,
             protocol=conn_protocol,
-            parameters={
-                "hostname": conn_hostname,
-                "port": str(conn_port)
-            },
-            attributes={
-
-            }
+            parameters=conn_parameters,
+            attributes=conn_attributes
         )),
-        verify=False,
-        timeout=30,
-        headers={"Content-Type": "application/json"}
+        timeout=30
     )
 
     if response.status_code not in (200,):
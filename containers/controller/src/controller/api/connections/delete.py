@@ -3,32 +3,19 @@ from urllib.parse import quote
 
 import requests
 
-from ..build_url import build_url
 from ..error import APIConnectionDoesNotExistError
 
 
 def api_delete_connection(
-    hostname: str,
-    port: int,
-    token: str,
-    data_source: str,
+    session: requests.Session,
+    url: str,
     conn_id: int
 ):
 
     logging.debug(f"Delete connection {conn_id=}")
-    response = requests.delete(
-        build_url(
-            scheme="http",
-            netloc=f"{hostname}:{port}",
-
-            path=f"/api/session/data/{quote(data_source)}/connections/{quote(str(conn_id))}",
-            query=dict(
-                token=token
-            )
-        ),
-        verify=False,
-        timeout=30,
-        headers={"Content-Type": "application/json"}
+    response = session.delete(
+        f"{url}/connections/{quote(str(conn_id))}",
+        timeout=30
     )
 
     if response.status_code not in (204,):
@@ -0,0 +1,45 @@
+
+def build_connection_parameters(
+    hostname: str,
+    port: int
+) -> dict:
+
+    return {
+        "hostname": hostname,
+        "port": str(port)
+    }
+
+
+def build_connection_attributes() -> dict:
+
+    return dict()
+
+
+def normalize_values(values: dict) -> dict:
+
+    # Guacamole omits unset parameters and returns unset attributes as null,
+    # so treat missing, null and empty values as the same thing
+    return {
+        key: str(value)
+        for key, value in (values or dict()).items()
+        if value not in (None, "")
+    }
+
+
+def connection_needs_update(
+    observed_connection: dict,
+    observed_parameters: dict,
+    name: str,
+    protocol: str,
+    parent: str,
+    parameters: dict,
+    attributes: dict
+) -> bool:
+
+    return any([
+        (name != observed_connection.get("name")),
+        (protocol != observed_connection.get("protocol")),
+        (parent != observed_connection.get("parentIdentifier")),
+        (normalize_values(parameters) != normalize_values(observed_parameters)),
+        (normalize_values(attributes) != normalize_values(observed_connection.get("attributes")))
+    ])
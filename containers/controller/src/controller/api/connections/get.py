@@ -5,32 +5,19 @@ from urllib.parse import quote
 
 import requests
 
-from ..build_url import build_url
 from ..error import APIConnectionDoesNotExistError
 
 
 def api_get_connection(
-    hostname: str,
-    port: int,
-    token: str,
-    data_source: str,
+    session: requests.Session,
+    url: str,
     conn_id: int
 ) -> dict:
 
     logging.debug(f"Get connection {conn_id=}")
-    response = requests.get(
-        build_url(
-            scheme="http",
-            netloc=f"{hostname}:{port}",
-
-            path=f"/api/session/data/{quote(data_source)}/connections/{quote(str(conn_id))}",
-            query=dict(
-                token=token
-            )
-        ),
-        verify=False,
-        timeout=30,
-        headers={"Content-Type": "application/json"}
+    response = session.get(
+        f"{url}/connections/{quote(str(conn_id))}",
+        timeout=30
     )
 
     if response.status_code not in (200,):
@@ -45,26 +32,15 @@ def api_get_connection(
 
 
 def api_get_connection_parameters(
-    hostname: str,
-    port: int,
-    token: str,
-    data_source: str,
+    session: requests.Session,
+    url: str,
     conn_id: int
 ) -> dict:
 
     logging.debug(f"Get connection parameters {conn_id=}")
-    response = requests.get(
-        build_url(
-            scheme="http",
-            netloc=f"{hostname}:{port}",
-            path=f"/api/session/data/{quote(data_source)}/connections/{quote(str(conn_id))}/parameters",
-            query=dict(
-                token=token
-            )
-        ),
-        verify=False,
-        timeout=30,
-        headers={"Content-Type": "application/json"}
+    response = session.get(
+        f"{url}/connections/{quote(str(conn_id))}/parameters",
+        timeout=30
     )
 
     if response.status_code not in (200,):
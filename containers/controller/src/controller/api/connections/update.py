@@ -5,49 +5,32 @@ from urllib.parse import quote
 
 import requests
 
-from ..build_url import build_url
 from ..error import APIConnectionDoesNotExistError
 
 
 def api_update_connection(
-    hostname: str,
-    port: int,
-    token: str,
-    data_source: str,
+    session: requests.Session,
+    url: str,
     conn_id: int,
     conn_name: str,
     conn_protocol: str,
     conn_parent: str,
-    conn_hostname: str,
-    conn_port: int
+    conn_parameters: dict,
+    conn_attributes: dict
 ):
 
     logging.debug(f"Updating connection {conn_name=} {conn_id=}")
-    response = requests.put(
-        build_url(
-            scheme="http",
-            netloc=f"{hostname}:{port}",
-            path=f"/api/session/data/{quote(data_source)}/connections/{quote(str(conn_id))}",
-            query=dict(
-                token=token
-            )
-        ),
+    response = session.put(
+        f"{url}/connections/{quote(str(conn_id))}",
         data=json.dumps(dict(
             identifier=str(conn_id),
             name=conn_name,
             parentIdentifier=conn_parent,
             protocol=conn_protocol,
-            parameters={
-                "hostname": conn_hostname,
-                "port": str(conn_port)
-            },
-            attributes={
-
-            }
+            parameters=conn_parameters,
+            attributes=conn_attributes
         )),
-        verify=False,
-        timeout=30,
-        headers={"Content-Type": "application/json"}
+        timeout=30
     )
 
     if response.status_code in (500,):
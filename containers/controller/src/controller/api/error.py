@@ -5,3 +5,10 @@ class APIUserDoesNotExistError(RuntimeError):
 
 class APIConnectionDoesNotExistError(RuntimeError):
     pass
+
+
+class APIPatchError(RuntimeError):
+
+    def __init__(self, *args, failures: list = None):
+        super().__init__(*args)
+        self.failures = failures or list()
@@ -0,0 +1,8 @@
+def escape_json_pointer(token: str) -> str:
+
+    # RFC 6901, "~" has to be escaped before "/" so the "~" it introduces isn't escaped again
+    return token.replace("~", "~0").replace("/", "~1")
+
+
+def unescape_json_pointer(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
@@ -0,0 +1,19 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def api_session(
+    pool_size: int
+) -> requests.Session:
+
+    session = requests.Session()
+
+    # Keep up to pool_size keep-alive connections open to the api between requests
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    session.verify = False
+    session.headers.update({"Content-Type": "application/json"})
+
+    return session
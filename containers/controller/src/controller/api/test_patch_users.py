@@ -0,0 +1,69 @@
+from unittest import mock
+
+import pytest
+
+from . import wrapper
+from .error import APIPatchError
+
+
+@pytest.fixture
+def api():
+    with mock.patch.object(wrapper, "api_authenticate_user", return_value="token"):
+        api = wrapper.API(hostname="localhost", port=8080, username="svc", password="", data_source="postgresql", batch_size=2)
+
+    api.users_by_name = dict()
+    yield api
+    api.executor.shutdown()
+
+
+def add_patch(username: str) -> dict:
+    return dict(op="add", path="/", value=dict(username=username, attributes=dict()))
+
+
+def test_patch_users_applies_every_chunk(api):
+
+    patches = [add_patch(f"u{index}") for index in range(5)]
+
+    with mock.patch.object(wrapper, "api_patch_users") as patch_users:
+        applied, failures = api.patch_users(patches)
+
+    assert (applied, failures) == (5, list())
+    assert patch_users.call_count == 3
+    assert sorted(api.users_by_name) == [f"u{index}" for index in range(5)]
+
+
+def test_patch_users_resends_a_rejected_chunk_without_its_failures(api):
+
+    patches = [add_patch("u0"), add_patch("exists"), add_patch("u2"), add_patch("u3")]
+
+    def patch_users(session, url, patches):
+        rejected = [dict(patch, error="exists") for patch in patches if patch["value"]["username"] == "exists"]
+        if rejected:
+            raise APIPatchError("Bad status code!", failures=rejected)
+
+    with mock.patch.object(wrapper, "api_patch_users", side_effect=patch_users) as sent:
+        applied, failures = api.patch_users(patches)
+
+    assert applied == 3
+    assert [failure["value"]["username"] for failure in failures] == ["exists"]
+
+    # The rejected chunk is sent again as one batch without the failed operation
+    assert [call.kwargs["patches"] for call in sent.call_args_list].count([add_patch("u0")]) == 1
+    assert sorted(api.users_by_name) == ["u0", "u2", "u3"]
+
+
+def test_patch_users_reports_a_chunk_that_raised_as_failed(api):
+
+    patches = [add_patch(f"u{index}") for index in range(4)]
+
+    def patch_users(session, url, patches):
+        if patches[0]["value"]["username"] == "u0":
+            raise ConnectionError("Connection reset")
+
+    with mock.patch.object(wrapper, "api_patch_users", side_effect=patch_users):
+        applied, failures = api.patch_users(patches)
+
+    assert applied == 2
+    assert failures == patches[:2]
+    assert sorted(api.users_by_name) == ["u2", "u3"]
+    assert len(api.errors) == 1
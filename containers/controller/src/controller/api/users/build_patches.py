@@ -0,0 +1,96 @@
+import typing
+from urllib.parse import quote
+
+from ..json_pointer import escape_json_pointer
+from .diff import build_user_attributes
+
+
+def build_user_add_patches(
+    users: list,
+    organization: str,
+    role: str
+) -> list:
+
+    return [
+        dict(
+            op="add",
+            path="/",
+            value=dict(
+                username=user["username"],
+                # Empty password so authentication is only ever handled by LDAP
+                password="",
+                attributes=build_user_attributes(
+                    fullname=user["fullname"],
+                    email=user["email"],
+                    organization=organization,
+                    role=role
+                )
+            )
+        )
+        for user in users
+    ]
+
+
+def build_user_replace_patches(
+    users: list,
+    organization: str,
+    role: str
+) -> list:
+
+    return [
+        dict(
+            op="replace",
+            path=f"/{escape_json_pointer(user['username'])}",
+            value=dict(
+                username=user["username"],
+                attributes=build_user_attributes(
+                    fullname=user["fullname"],
+                    email=user["email"],
+                    organization=organization,
+                    role=role
+                )
+            )
+        )
+        for user in users
+    ]
+
+
+def build_user_remove_patches(usernames: list) -> list:
+
+    return [
+        dict(
+            op="remove",
+            path=f"/{escape_json_pointer(username)}"
+        )
+        for username in usernames
+    ]
+
+
+def build_permission_patches(
+    grant_conn_ids: typing.Iterable[str] = (),
+    revoke_conn_ids: typing.Iterable[str] = ()
+) -> list:
+
+    return [
+        dict(
+            op="add",
+            path=f"/connectionPermissions/{quote(str(conn_id))}",
+            value="READ"
+        )
+        for conn_id in sorted(grant_conn_ids)
+    ] + [
+        dict(
+            op="remove",
+            path=f"/connectionPermissions/{quote(str(conn_id))}",
+            value="READ"
+        )
+        for conn_id in sorted(revoke_conn_ids)
+    ]
+
+
+def chunk_patches(patches: list, batch_size: int) -> list:
+
+    return [
+        patches[offset:offset + batch_size]
+        for offset in range(0, len(patches), batch_size)
+    ]
@@ -1,23 +1,15 @@
 import json
 import logging
 # import secrets
-from urllib.parse import quote
 
 import requests
 
-from ..build_url import build_url
-
 
 def api_create_user(
-    hostname: str,
-    port: int,
-    token: str,
-    data_source: str,
+    session: requests.Session,
+    url: str,
     username: str,
-    fullname: str,
-    email: str,
-    organization: str,
-    role: str
+    attributes: dict
 ) -> dict:
 
     # PASSWORD MUST BE SET TO EMPTY STRING SO THAT AUTHENTICATION
@@ -29,28 +21,14 @@ def api_create_user(
     # DISABLE_PASSWORD = secrets.token_hex(32)
 
     logging.debug(f"Creating user {username=}")
-    response = requests.post(
-        build_url(
-            scheme="http",
-            netloc=f"{hostname}:{port}",
-            path=f"/api/session/data/{quote(data_source)}/users",
-            query=dict(
-                token=token
-            )
-        ),
+    response = session.post(
+        f"{url}/users",
         data=json.dumps(dict(
             username=username,
             password=DISABLE_PASSWORD,
-            attributes={
-                "guac-full-name": fullname,
-                "guac-email-address": email,
-                "guac-organization": organization,
-                "guac-organizational-role": role
-            }
+            attributes=attributes
         )),
-        verify=False,
-        timeout=30,
-        headers={"Content-Type": "application/json"}
+        timeout=30
     )
 
     if response.status_code not in (200,):
@@ -5,29 +5,19 @@ from urllib.parse import quote
 
 import requests
 
-from ..build_url import build_url
 from ..error import APIUserDoesNotExistError
 
 
 def api_delete_user_connection(
-    hostname: str,
-    port: int,
-    token: str,
-    data_source: str,
+    session: requests.Session,
+    url: str,
     username: str,
     conn_id: int
 ):
 
     logging.debug(f"Removing user from connection {username=} {conn_id=}")
-    response = requests.patch(
-        build_url(
-            scheme="http",
-            netloc=f"{hostname}:{port}",
-            path=f"/api/session/data/{quote(data_source)}/users/{quote(username)}/permissions",
-            query=dict(
-                token=token
-            )
-        ),
+    response = session.patch(
+        f"{url}/users/{quote(username)}/permissions",
         data=json.dumps([
             dict(
                 op="remove",
@@ -35,9 +25,7 @@ def api_delete_user_connection(
                 value="READ"
             )
         ]),
-        verify=False,
-        timeout=30,
-        headers={"Content-Type": "application/json"}
+        timeout=30
     )
 
     if response.status_code not in (204,):
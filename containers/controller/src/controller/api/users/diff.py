@@ -0,0 +1,27 @@
+
+def build_user_attributes(
+    fullname: str,
+    email: str,
+    organization: str,
+    role: str
+) -> dict:
+
+    return {
+        "guac-full-name": fullname,
+        "guac-email-address": email,
+        "guac-organization": organization,
+        "guac-organizational-role": role
+    }
+
+
+def user_needs_update(
+    observed_user: dict,
+    attributes: dict
+) -> bool:
+
+    observed_attributes = observed_user.get("attributes") or dict()
+
+    return any([
+        (value != observed_attributes.get(key))
+        for key, value in attributes.items()
+    ])
@@ -5,32 +5,19 @@ from urllib.parse import quote
 
 import requests
 
-from ..build_url import build_url
 from ..error import APIUserDoesNotExistError
 
 
 def api_get_user(
-    hostname: str,
-    port: int,
-    token: str,
-    data_source: str,
+    session: requests.Session,
+    url: str,
     username: str,
 ) -> dict:
 
     logging.debug(f"Get user {username=}")
-    response = requests.get(
-        build_url(
-            scheme="http",
-            netloc=f"{hostname}:{port}",
-
-            path=f"/api/session/data/{quote(data_source)}/users/{quote(username)}",
-            query=dict(
-                token=token
-            )
-        ),
-        verify=False,
-        timeout=30,
-        headers={"Content-Type": "application/json"}
+    response = session.get(
+        f"{url}/users/{quote(username)}",
+        timeout=30
     )
 
     if response.status_code not in (200,):
@@ -45,27 +32,15 @@ def api_get_user(
 
 
 def api_get_user_effective_permissions(
-    hostname: str,
-    port: int,
-    token: str,
-    data_source: str,
+    session: requests.Session,
+    url: str,
     username: str,
 ) -> dict:
 
     logging.debug(f"Get user effective permissions {username=}")
-    response = requests.get(
-        build_url(
-            scheme="http",
-            netloc=f"{hostname}:{port}",
-
-            path=f"/api/session/data/{quote(data_source)}/users/{quote(username)}/effectivePermissions",
-            query=dict(
-                token=token
-            )
-        ),
-        verify=False,
-        timeout=30,
-        headers={"Content-Type": "application/json"}
+    response = session.get(
+        f"{url}/users/{quote(username)}/effectivePermissions",
+        timeout=30
     )
 
     if response.status_code not in (200,):
@@ -0,0 +1,37 @@
+
+import json
+import logging
+
+import requests
+
+from ..error import APIPatchError
+from .patch_failures import api_patch_failures
+
+
+def api_patch_users(
+    session: requests.Session,
+    url: str,
+    patches: list
+) -> dict:
+
+    logging.debug(f"Patching users {len(patches)=}")
+    response = session.patch(
+        f"{url}/users",
+        data=json.dumps(patches),
+        timeout=30
+    )
+
+    if response.status_code not in (200, 204):
+
+        failures = api_patch_failures(patches=patches, text=response.text)
+
+        ex = APIPatchError(("Bad status code!", response.status_code, response.text), failures=failures)
+        logging.exception("Bad status code!", exc_info=ex)
+        raise ex
+
+    if not response.text:
+        return dict()
+
+    response = json.loads(response.text)
+    logging.debug(f"{response=}")
+    return response
@@ -0,0 +1,41 @@
+import json
+
+
+def api_patch_failures(
+    patches: list,
+    text: str
+) -> list:
+
+    # Guacamole applies a directory patch atomically and reports the outcome of each
+    # operation in order, so pair the rejected outcomes with the operations that caused them
+    try:
+        outcomes = json.loads(text).get("patches") or list()
+    except (ValueError, AttributeError):
+        outcomes = list()
+
+    if len(outcomes) == len(patches):
+        failures = [
+            dict(patch, error=outcome["error"])
+            for patch, outcome in zip(patches, outcomes)
+            if outcome.get("error")
+        ]
+
+        if failures:
+            return failures
+
+    # Without a usable outcome per operation every operation in the patch is reported
+    return [dict(patch, error=text) for patch in patches]
+
+
+def api_patch_remaining(
+    patches: list,
+    failures: list
+) -> list:
+
+    # The operations of a rejected patch that were not themselves at fault
+    failed = [
+        {key: value for key, value in failure.items() if key != "error"}
+        for failure in failures
+    ]
+
+    return [patch for patch in patches if patch not in failed]
@@ -0,0 +1,31 @@
+
+import json
+import logging
+from urllib.parse import quote
+
+import requests
+
+from ..error import APIPatchError
+
+
+def api_patch_user_permissions(
+    session: requests.Session,
+    url: str,
+    username: str,
+    patches: list
+):
+
+    logging.debug(f"Patching user permissions {username=} {len(patches)=}")
+    response = session.patch(
+        f"{url}/users/{quote(username)}/permissions",
+        data=json.dumps(patches),
+        timeout=30
+    )
+
+    if response.status_code not in (204,):
+        ex = APIPatchError(
+            ("Bad status code!", response.status_code, response.text),
+            failures=[dict(patch, username=username, error=response.text) for patch in patches]
+        )
+        logging.exception("Bad status code!", exc_info=ex)
+        raise ex
@@ -5,45 +5,24 @@ from urllib.parse import quote
 
 import requests
 
-from ..build_url import build_url
 from ..error import APIUserDoesNotExistError
 
 
 def api_update_user(
-    hostname: str,
-    port: int,
-    token: str,
-    data_source: str,
+    session: requests.Session,
+    url: str,
     username: str,
-    fullname: str,
-    email: str,
-    organization: str,
-    role: str
+    attributes: dict
 ):
 
     logging.debug(f"Updating user {username=}")
-    response = requests.put(
-        build_url(
-            scheme="http",
-            netloc=f"{hostname}:{port}",
-
-            path=f"/api/session/data/{quote(data_source)}/users/{quote(username)}",
-            query=dict(
-                token=token
-            )
-        ),
+    response = session.put(
+        f"{url}/users/{quote(username)}",
         data=json.dumps(dict(
             username=username,
-            attributes={
-                "guac-full-name": fullname,
-                "guac-email-address": email,
-                "guac-organization": organization,
-                "guac-organizational-role": role
-            }
+            attributes=attributes
         )),
-        verify=False,
-        timeout=30,
-        headers={"Content-Type": "application/json"}
+        timeout=30
     )
 
     if response.status_code not in (204,):
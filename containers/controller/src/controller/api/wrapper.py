@@ -1,19 +1,46 @@
 import logging
+import threading
+import typing
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import quote, unquote
 
-from .error import APIConnectionDoesNotExistError, APIUserDoesNotExistError
+import requests
+
+from .error import APIConnectionDoesNotExistError, APIPatchError, APIUserDoesNotExistError
 from .authenticate_user import api_authenticate_user
+from .build_url import build_url
+from .json_pointer import unescape_json_pointer
 from .connections.create import api_create_connection
+from .connections.diff import (
+    build_connection_attributes,
+    build_connection_parameters,
+    connection_needs_update
+)
 from .connections.delete import api_delete_connection
 from .connections.get import api_get_connection, api_get_connection_parameters
 from .connections.list import api_list_connections
 from .connections.update import api_update_connection
+from .users.build_patches import (
+    build_permission_patches,
+    build_user_add_patches,
+    build_user_remove_patches,
+    build_user_replace_patches,
+    chunk_patches
+)
+from .users.diff import build_user_attributes, user_needs_update
 from .users.create_user_connection import api_create_user_connection
 from .users.delete_user_connection import api_delete_user_connection
 from .users.get import api_get_user, api_get_user_effective_permissions
 from .users.create import api_create_user
 from .users.delete import api_delete_user
 from .users.list import api_list_users
+from .users.patch import api_patch_users
+from .users.patch_failures import api_patch_remaining
+from .users.patch_permissions import api_patch_user_permissions
 from .users.update import api_update_user
+from .session import api_session
 
 
 class API:
@@ -23,7 +50,21 @@ class API:
     username: str
     password: str
     data_source: str
+    batch_size: int
+    pool_size: int
+    workers: int
+    executor: ThreadPoolExecutor
+    session: requests.Session
+    url: str
+    data_url: str
     token: str
+    connections_by_name: dict
+    users_by_name: dict
+    users_by_connection: dict
+    unindexed_users: set
+    stats: Counter
+    errors: list
+    lock: threading.Lock
 
     def __init__(
         self,
@@ -32,6 +73,9 @@ class API:
         username: str,
         password: str,
         data_source: str,
+        batch_size: int = 100,
+        pool_size: int = 10,
+        workers: int = 8
     ):
 
         self.hostname = hostname
@@ -39,40 +83,125 @@ class API:
         self.username = username
         self.password = password
         self.data_source = data_source
+        self.batch_size = batch_size
+        self.pool_size = pool_size
+        self.workers = workers
+
+        # Precompute the urls once, every request goes through the pooled keep-alive session
+        self.url = build_url(scheme="http", netloc=f"{hostname}:{port}")
+        self.data_url = f"{self.url}/api/session/data/{quote(data_source)}"
+        self.session = api_session(pool_size=max(pool_size, workers))
+
+        # Bounded pool for running independent api calls concurrently, threads
+        # started by it are marked so nested calls run inline instead of deadlocking
+        self.local = threading.local()
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="api",
+            initializer=self._mark_worker
+        )
+
+        # Index of connection name -> connection, rebuilt on every listing and kept
+        # current by this controller's own creates, updates and deletes
+        self.connections_by_name = None
+
+        # Index of username -> user, rebuilt on every listing and kept current by
+        # this controller's own batched creates, updates and deletes
+        self.users_by_name = None
+
+        # Index of connection identifier -> usernames with READ access, rebuilt on every
+        # full permission scan and kept current by this controller's own grants and revokes
+        self.users_by_connection = None
+
+        # Usernames whose permissions failed to load in the last full scan, so their
+        # absence from the index says nothing about their access
+        self.unindexed_users = set()
+
+        # Counts of the writes made and skipped, reported and cleared once per sync cycle
+        self.stats = Counter()
+        self.errors = list()
+        self.lock = threading.Lock()
 
         self.token = api_authenticate_user(
-            hostname=hostname,
-            port=port,
+            session=self.session,
+            url=self.url,
             username=username,
             password=password
         )
 
+        # Authenticate every subsequent request made through the session
+        self.session.params = dict(token=self.token)
+
+    def _mark_worker(self):
+        self.local.worker = True
+
+    def count(self, key: str, value: int = 1):
+        with self.lock:
+            self.stats[key] += value
+
+    def clear_stats(self):
+        with self.lock:
+            self.stats.clear()
+            self.errors.clear()
+
+    def run_concurrently(
+        self,
+        fn: typing.Callable,
+        items: typing.Iterable
+    ) -> list:
+
+        items = list(items)
+
+        # Calls made from inside a worker run inline so the bounded pool can never
+        # be exhausted by tasks waiting on their own subtasks
+        if getattr(self.local, "worker", False):
+            calls = [partial(fn, item) for item in items]
+        else:
+            calls = [self.executor.submit(fn, item).result for item in items]
+
+        # Failures are logged and collected for the cycle rather than abandoning
+        # the calls still in flight, failed items return None
+        results = list()
+        for call in calls:
+            try:
+                results.append(call())
+
+            except Exception as ex:
+                logging.exception("Concurrent api call failed!", exc_info=ex)
+                with self.lock:
+                    self.errors.append(ex)
+                results.append(None)
+
+        return results
+
     def list_users(self):
         # logging.info(f"List users")
-        return api_list_users(
-            hostname=self.hostname,
-            port=self.port,
-            token=self.token,
-            data_source=self.data_source
+        users = api_list_users(
+            session=self.session,
+            url=self.data_url
         )
 
+        with self.lock:
+            self.users_by_name = {
+                user["username"]: user
+                for user in users.values()
+            }
+
+        return users
+
     def get_user(self, username: str):
         # logging.info(f"Get user {username=}")
         return api_get_user(
-            hostname=self.hostname,
-            port=self.port,
-            token=self.token,
-            data_source=self.data_source,
+            session=self.session,
+            url=self.data_url,
             username=username
         )
 
     def get_user_effective_permissions(self, username: str):
         # logging.info(f"Get user effective permissions {username=}")
         return api_get_user_effective_permissions(
-            hostname=self.hostname,
-            port=self.port,
-            token=self.token,
-            data_source=self.data_source,
+            session=self.session,
+            url=self.data_url,
             username=username
         )
 
@@ -90,17 +219,19 @@ class API:
 
         logging.info(f"Creating user {username=}")
         api_create_user(
-            hostname=self.hostname,
-            port=self.port,
-            token=self.token,
-            data_source=self.data_source,
+            session=self.session,
+            url=self.data_url,
             username=username,
-            fullname=fullname,
-            email=email,
-            organization=organization,
-            role=role
+            attributes=build_user_attributes(
+                fullname=fullname,
+                email=email,
+                organization=organization,
+                role=role
+            )
         )
 
+        self.count("users_created")
+
     def update_user(
         self,
         username: str,
@@ -115,17 +246,19 @@ class API:
 
         logging.info(f"Updating user {username=}")
         api_update_user(
-            hostname=self.hostname,
-            port=self.port,
-            token=self.token,
-            data_source=self.data_source,
+            session=self.session,
+            url=self.data_url,
             username=username,
-            fullname=fullname,
-            email=email,
-            organization=organization,
-            role=role
+            attributes=build_user_attributes(
+                fullname=fullname,
+                email=email,
+                organization=organization,
+                role=role
+            )
         )
 
+        self.count("users_updated")
+
     def create_or_update_user(
         self,
         username: str,
@@ -138,12 +271,15 @@ class API:
         try:
             user = self.get_user(username=username)
 
-            needs_update = any([
-                (fullname != user["attributes"]["guac-full-name"]),
-                (email != user["attributes"]["guac-email-address"]),
-                (organization != user["attributes"]["guac-organization"]),
-                (role != user["attributes"]["guac-organizational-role"])
-            ])
+            needs_update = user_needs_update(
+                observed_user=user,
+                attributes=build_user_attributes(
+                    fullname=fullname,
+                    email=email,
+                    organization=organization,
+                    role=role
+                )
+            )
 
             if needs_update:
                 self.update_user(
@@ -174,49 +310,196 @@ class API:
 
         logging.info(f"Delete user {username=}")
         api_delete_user(
-            hostname=self.hostname,
-            port=self.port,
-            token=self.token,
-            data_source=self.data_source,
+            session=self.session,
+            url=self.data_url,
             username=username
         )
 
+        self.count("users_deleted")
+
+    def patch_users(self, patches: list):
+
+        def patch_chunk(chunk: list):
+            try:
+                api_patch_users(
+                    session=self.session,
+                    url=self.data_url,
+                    patches=chunk
+                )
+                return chunk, list()
+
+            except APIPatchError as ex:
+                failures = ex.failures
+
+            # A rejected chunk applies none of its operations, so resend it once as a single
+            # batch without the operations that were at fault
+            remaining = api_patch_remaining(patches=chunk, failures=failures)
+            if not remaining or (len(remaining) == len(chunk)):
+                return list(), failures
+
+            try:
+                api_patch_users(
+                    session=self.session,
+                    url=self.data_url,
+                    patches=remaining
+                )
+                return remaining, failures
+
+            except APIPatchError as ex:
+                return list(), failures + ex.failures
+
+        # Send the operations in concurrent chunks, each chunk is applied or rejected as a whole
+        chunks = chunk_patches(patches=patches, batch_size=self.batch_size)
+
+        applied = 0
+        failures = list()
+        for chunk, result in zip(chunks, self.run_concurrently(patch_chunk, chunks)):
+
+            # A chunk that raised rather than being rejected counts every operation in it as failed
+            if result is None:
+                failures.extend(chunk)
+                continue
+
+            applied += len(result[0])
+            failures.extend(result[1])
+
+            # Keep the user index current with the changes this controller made
+            if result[0]:
+                with self.lock:
+                    if self.users_by_name is not None:
+                        for patch in result[0]:
+                            if patch["op"] == "remove":
+                                self.users_by_name.pop(unescape_json_pointer(patch["path"][1:]), None)
+                            else:
+                                self.users_by_name[patch["value"]["username"]] = dict(
+                                    username=patch["value"]["username"],
+                                    attributes=patch["value"]["attributes"]
+                                )
+
+        for failure in failures:
+            logging.error(f"Failed to patch user {failure=}")
+
+        return applied, failures
+
+    def create_users(
+        self,
+        users: list,
+        organization: str,
+        role: str
+    ):
+
+        if any((self.username == user["username"]) for user in users):
+            raise ValueError(("Trying to create user with same name as service account!", self.username))
+
+        logging.info(f"Creating {len(users)} users")
+        applied, failures = self.patch_users(patches=build_user_add_patches(
+            users=users,
+            organization=organization,
+            role=role
+        ))
+
+        self.count("users_created", applied)
+        self.count("users_failed", len(failures))
+        return failures
+
+    def update_users(
+        self,
+        users: list,
+        organization: str,
+        role: str
+    ):
+
+        if any((self.username == user["username"]) for user in users):
+            raise ValueError(("Trying to update user with same name as service account!", self.username))
+
+        logging.info(f"Updating {len(users)} users")
+        applied, failures = self.patch_users(patches=build_user_replace_patches(
+            users=users,
+            organization=organization,
+            role=role
+        ))
+
+        self.count("users_updated", applied)
+        self.count("users_failed", len(failures))
+        return failures
+
+    def delete_users(self, usernames: list):
+
+        if self.username in usernames:
+            raise ValueError(("Trying to delete user with same name as service account!", self.username))
+
+        logging.info(f"Deleting {len(usernames)} users")
+        applied, failures = self.patch_users(patches=build_user_remove_patches(usernames=usernames))
+
+        self.count("users_deleted", applied)
+        self.count("users_failed", len(failures))
+        return failures
+
     def list_connections(self):
         # logging.info(f"List connections")
-        return api_list_connections(
-            hostname=self.hostname,
-            port=self.port,
-            token=self.token,
-            data_source=self.data_source
+        connections = api_list_connections(
+            session=self.session,
+            url=self.data_url
         )
 
-    def get_connection_id(self, conn_name: str):
+        with self.lock:
+            self.connections_by_name = {
+                connection["name"]: connection
+                for connection in connections.values()
+            }
+
+        return connections
+
+    def get_connection_id(self, conn_name: str, conn_id: str = None):
 
-        connections = self.list_connections()
+        with self.lock:
+            connection = (self.connections_by_name or dict()).get(conn_name)
 
-        for connection in connections.values():
-            if connection["name"] == conn_name:
-                return connection["identifier"]
+        if connection is not None:
+            return connection["identifier"]
 
-        raise APIConnectionDoesNotExistError(("Connection does not exist!", conn_name, connections))
+        # Try the identifier recorded on the manifest status, which saves listing every
+        # connection straight after a restart and finds connections created by another
+        # replica since the index was listed
+        if conn_id is not None:
+            try:
+                connection = self.get_connection(conn_id=conn_id)
+
+                if connection["name"] == conn_name:
+                    with self.lock:
+                        if self.connections_by_name is not None:
+                            self.connections_by_name[conn_name] = connection
+
+                    return connection["identifier"]
+
+            except APIConnectionDoesNotExistError:
+                pass
+
+        # The index may be stale, check a fresh listing before the caller creates a
+        # connection that would duplicate the name
+        self.list_connections()
+
+        with self.lock:
+            connection = self.connections_by_name.get(conn_name)
+
+        if connection is None:
+            raise APIConnectionDoesNotExistError(("Connection does not exist!", conn_name))
+
+        return connection["identifier"]
 
     def get_connection(self, conn_id: int):
         # logging.info(f"Get connection {conn_id=}")
         return api_get_connection(
-            hostname=self.hostname,
-            port=self.port,
-            token=self.token,
-            data_source=self.data_source,
+            session=self.session,
+            url=self.data_url,
             conn_id=conn_id
         )
 
     def get_connection_parameters(self, conn_id: int):
         # logging.info(f"Get connection parameters {conn_id=}")
         return api_get_connection_parameters(
-            hostname=self.hostname,
-            port=self.port,
-            token=self.token,
-            data_source=self.data_source,
+            session=self.session,
+            url=self.data_url,
             conn_id=conn_id
         )
 
@@ -231,17 +514,22 @@ class API:
 
         logging.info(f"Creating connection {name=}")
         response = api_create_connection(
-            hostname=self.hostname,
-            port=self.port,
-            token=self.token,
-            data_source=self.data_source,
+            session=self.session,
+            url=self.data_url,
             conn_name=name,
             conn_protocol=protocol,
             conn_parent=parent,
-            conn_hostname=hostname,
-            conn_port=port
+            conn_parameters=build_connection_parameters(
+                hostname=hostname,
+                port=port
+            ),
+            conn_attributes=build_connection_attributes()
         )
 
+        with self.lock:
+            if self.connections_by_name is not None:
+                self.connections_by_name[name] = response
+
         return response["identifier"]
 
     def update_connection(
@@ -255,35 +543,62 @@ class API:
     ):
         logging.info(f"Updating connection {name=} {conn_id=}")
         api_update_connection(
-            hostname=self.hostname,
-            port=self.port,
-            token=self.token,
-            data_source=self.data_source,
+            session=self.session,
+            url=self.data_url,
             conn_id=conn_id,
             conn_name=name,
             conn_protocol=protocol,
             conn_parent=parent,
-            conn_hostname=hostname,
-            conn_port=port
+            conn_parameters=build_connection_parameters(
+                hostname=hostname,
+                port=port
+            ),
+            conn_attributes=build_connection_attributes()
         )
 
+        with self.lock:
+            if self.connections_by_name is not None:
+                self.connections_by_name[name] = dict(
+                    self.connections_by_name.get(name, dict()),
+                    identifier=str(conn_id),
+                    name=name,
+                    protocol=protocol,
+                    parentIdentifier=parent,
+                    attributes=build_connection_attributes()
+                )
+
     def create_or_update_connection(
         self,
         name: str,
         protocol: str,
         parent: str,
         hostname: str,
-        port: int
+        port: int,
+        conn_id: str = None
     ):
 
         try:
-            conn_id = self.get_connection_id(conn_name=name)
+            conn_id = self.get_connection_id(conn_name=name, conn_id=conn_id)
+
+            if self.connections_by_name is not None and name in self.connections_by_name:
+                connection = self.connections_by_name[name]
+            else:
+                connection = self.get_connection(conn_id=conn_id)
 
-            # connection = self.get_connection(conn_id=conn_id)
-            # connection_parameters = self.get_connection_parameters(conn_id=conn_id)
+            connection_parameters = self.get_connection_parameters(conn_id=conn_id)
 
-            # TODO determine if connection needs updating
-            needs_update = True
+            needs_update = connection_needs_update(
+                observed_connection=connection,
+                observed_parameters=connection_parameters,
+                name=name,
+                protocol=protocol,
+                parent=parent,
+                parameters=build_connection_parameters(
+                    hostname=hostname,
+                    port=port
+                ),
+                attributes=build_connection_attributes()
+            )
 
             if needs_update:
 
@@ -296,14 +611,17 @@ class API:
                     port=port
                 )
 
-                return conn_id
+                self.count("connections_updated")
 
-            # else:
-            #     logging.info(f"Skipping updating connection {name=}")
+            else:
+                logging.debug(f"Skipping updating connection {name=}")
+                self.count("connections_unchanged")
+
+            return conn_id
 
         except APIConnectionDoesNotExistError:
 
-            return self.create_connection(
+            conn_id = self.create_connection(
                 name=name,
                 protocol=protocol,
                 parent=parent,
@@ -311,16 +629,27 @@ class API:
                 port=port
             )
 
+            # Only counted once the create has succeeded
+            self.count("connections_created")
+
+            return conn_id
+
     def delete_connection(self, conn_id: int):
         logging.info(f"Delete connection {conn_id=}")
         api_delete_connection(
-            hostname=self.hostname,
-            port=self.port,
-            token=self.token,
-            data_source=self.data_source,
+            session=self.session,
+            url=self.data_url,
             conn_id=conn_id
         )
 
+        with self.lock:
+            if self.connections_by_name is not None:
+                self.connections_by_name = {
+                    name: connection
+                    for name, connection in self.connections_by_name.items()
+                    if str(connection["identifier"]) != str(conn_id)
+                }
+
     def create_user_connection(
         self,
         username: str,
@@ -328,10 +657,8 @@ class API:
     ):
         logging.info(f"Create user connection {username=} {conn_id=}")
         api_create_user_connection(
-            hostname=self.hostname,
-            port=self.port,
-            token=self.token,
-            data_source=self.data_source,
+            session=self.session,
+            url=self.data_url,
             username=username,
             conn_id=conn_id,
         )
@@ -343,34 +670,106 @@ class API:
     ):
         logging.info(f"Delete user connection {username=} {conn_id=}")
         api_delete_user_connection(
-            hostname=self.hostname,
-            port=self.port,
-            token=self.token,
-            data_source=self.data_source,
+            session=self.session,
+            url=self.data_url,
             username=username,
             conn_id=conn_id,
         )
 
-    def list_connection_users(
+    def update_user_connections(
         self,
-        conn_id: int
+        username: str,
+        grant_conn_ids: typing.Iterable[str] = (),
+        revoke_conn_ids: typing.Iterable[str] = ()
     ):
 
-        users = self.list_users()
+        patches = build_permission_patches(
+            grant_conn_ids=grant_conn_ids,
+            revoke_conn_ids=revoke_conn_ids
+        )
 
-        connection_users = dict()
-        for user in users.values():
+        logging.info(f"Update user connections {username=} {len(patches)=}")
 
-            username = user["username"]
+        failures = list()
+        for chunk in chunk_patches(patches=patches, batch_size=self.batch_size):
 
-            permissions = self.get_user_effective_permissions(username=username)
+            try:
+                api_patch_user_permissions(
+                    session=self.session,
+                    url=self.data_url,
+                    username=username,
+                    patches=chunk
+                )
 
-            if str(conn_id) not in permissions["connectionPermissions"]:
-                continue
+                self.count("permissions_granted", sum((patch["op"] == "add") for patch in chunk))
+                self.count("permissions_revoked", sum((patch["op"] == "remove") for patch in chunk))
+
+                # Keep the permission index current with the changes this controller made
+                with self.lock:
+                    if self.users_by_connection is not None:
+                        for patch in chunk:
+                            conn_id = unquote(patch["path"].rsplit("/", 1)[-1])
+                            conn_users = self.users_by_connection.setdefault(conn_id, set())
+                            if patch["op"] == "add":
+                                conn_users.add(username)
+                            else:
+                                conn_users.discard(username)
+
+            except APIPatchError as ex:
+                failures.extend(ex.failures)
+
+        for failure in failures:
+            logging.error(f"Failed to patch user permission {failure=}")
+
+        self.count("permissions_failed", len(failures))
+        return failures
 
-            if "READ" not in permissions["connectionPermissions"][str(conn_id)]:
+    def list_users_by_connection(self, users: dict = None):
+
+        if users is None:
+            users = self.list_users()
+
+        # Fetch each user's permissions at most once and invert them into an index of
+        # connection identifier -> usernames with READ access to that connection
+        usernames = [user["username"] for user in users.values()]
+
+        permissions_by_user = self.run_concurrently(
+            lambda username: self.get_user_effective_permissions(username=username),
+            usernames
+        )
+
+        users_by_connection = defaultdict(set)
+        unindexed_users = set()
+        for username, permissions in zip(usernames, permissions_by_user):
+
+            if permissions is None:
+                unindexed_users.add(username)
                 continue
 
-            connection_users[username] = user
+            for conn_id, conn_permissions in permissions["connectionPermissions"].items():
+                if "READ" in conn_permissions:
+                    users_by_connection[str(conn_id)].add(username)
+
+        with self.lock:
+            self.users_by_connection = {
+                conn_id: set(usernames)
+                for conn_id, usernames in users_by_connection.items()
+            }
+            self.unindexed_users = unindexed_users
+
+        return dict(users_by_connection)
+
+    def list_connection_users(
+        self,
+        conn_id: int
+    ):
+
+        users = self.list_users()
+
+        users_by_connection = self.list_users_by_connection(users=users)
 
-        return connection_users
+        return {
+            user["username"]: user
+            for user in users.values()
+            if user["username"] in users_by_connection.get(str(conn_id), set())
+        }
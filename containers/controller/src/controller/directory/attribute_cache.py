@@ -0,0 +1,59 @@
+import logging
+import threading
+from collections import Counter, OrderedDict
+
+
+class LDAPAttributeCache:
+
+    max_size: int
+    records: OrderedDict
+    stats: Counter
+    lock: threading.Lock
+
+    def __init__(self, max_size: int = 100000):
+
+        # Least recently used records are evicted past max_size, bounding memory however
+        # large the directory is
+        self.max_size = max_size
+
+        # Normalized user dn -> (version it was fetched at, attributes fetched, search record)
+        self.records = OrderedDict()
+
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(dn: str) -> str:
+        return dn.lower()
+
+    def get(self, dn: str, version, attributes: list) -> dict:
+
+        with self.lock:
+            cached_version, cached_attributes, record = self.records.get(self.key(dn), (None, None, None))
+
+            # Without a version there is no telling whether the record changed
+            if (record is None) or (not version) or (cached_version != version) or \
+                    not cached_attributes.issuperset(attributes):
+                self.stats["misses"] += 1
+                return None
+
+            self.records.move_to_end(self.key(dn))
+            self.stats["hits"] += 1
+            return record
+
+    def put(self, dn: str, version, attributes: list, record: dict):
+
+        with self.lock:
+            self.records[self.key(dn)] = (version, frozenset(attributes), record)
+            self.records.move_to_end(self.key(dn))
+
+            while len(self.records) > self.max_size:
+                self.records.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def report(self):
+
+        # Called as each cycle starts
+        with self.lock:
+            logging.info(f"Attribute cache {dict(self.stats)} with {len(self.records)} users")
+            self.stats.clear()
@@ -13,7 +13,9 @@ def ldap_authenticate_user(
     server = Server(host=hostname, port=port, use_ssl=True, get_info=ALL)
 
     logging.info("binding user")
-    client = Connection(server, user=username, password=password, auto_bind=True)
+    # Ranged attributes are followed by the group walk as it goes, rather than by ldap3
+    # gathering every range of every entry in a page before returning it
+    client = Connection(server, user=username, password=password, auto_bind=True, auto_range=False)
     client.start_tls()
 
     return client
@@ -0,0 +1,106 @@
+import logging
+import threading
+import typing
+
+from ldap3 import Connection
+from ldap3.core.exceptions import LDAPCommunicationError
+
+
+class LDAPConnectionPool:
+
+    connect: typing.Callable[[], Connection]
+    size: int
+    retries: int
+    idle: list
+    opened: int
+    condition: threading.Condition
+
+    def __init__(
+        self,
+        connect: typing.Callable[[], Connection],
+        size: int = 4,
+        retries: int = 1
+    ):
+
+        # Opens and binds a new connection
+        self.connect = connect
+        self.size = size
+        self.retries = retries
+
+        # Bound connections waiting to be used, more are opened on demand up to size,
+        # waiters are woken whenever a connection is released or discarded
+        self.idle = list()
+        self.opened = 0
+        self.condition = threading.Condition()
+
+    def acquire(self) -> Connection:
+
+        while True:
+            with self.condition:
+
+                # At capacity, wait for another thread to release or discard its connection
+                while (not self.idle) and (self.opened >= self.size):
+                    self.condition.wait()
+
+                client = self.idle.pop() if self.idle else None
+                if client is None:
+                    self.opened += 1
+
+            if client is None:
+                try:
+                    return self.connect()
+
+                except Exception:
+                    with self.condition:
+                        self.opened -= 1
+                        self.condition.notify()
+                    raise
+
+            # The server may have closed an idle connection, bind a new one in its place
+            if not client.closed:
+                return client
+
+            logging.info("Replacing closed ldap connection")
+            self.discard(client)
+
+    def release(self, client: Connection):
+        with self.condition:
+            self.idle.append(client)
+            self.condition.notify()
+
+    def discard(self, client: Connection):
+
+        with self.condition:
+            self.opened -= 1
+            self.condition.notify()
+
+        try:
+            client.unbind()
+
+        except Exception:
+            pass
+
+    def run(self, fn: typing.Callable[[Connection], typing.Any]):
+
+        # A dropped connection is replaced with a newly bound one and the call made again
+        for attempt in range(self.retries + 1):
+            client = self.acquire()
+
+            try:
+                result = fn(client)
+
+            except LDAPCommunicationError as ex:
+                self.discard(client)
+
+                if attempt >= self.retries:
+                    raise
+
+                logging.warning(f"Lost ldap connection, rebinding {attempt=}", exc_info=ex)
+                continue
+
+            except Exception:
+                self.release(client)
+                raise
+
+            self.release(client)
+            return result
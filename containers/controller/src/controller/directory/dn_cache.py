@@ -0,0 +1,91 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+USER = "user"
+GROUP = "group"
+UNRESOLVED = "unresolved"
+
+
+class LDAPDnCache:
+
+    ttl: float
+    kinds: dict
+    stats: Counter
+    lock: threading.Lock
+
+    def __init__(self, ttl: float = 3600):
+
+        # A dn's kind rarely changes, so classifications carry over between cycles for ttl seconds
+        self.ttl = ttl
+
+        # Normalized dn -> (time classified, user, group or unresolved when it was neither)
+        self.kinds = dict()
+
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(dn: str) -> str:
+
+        # Case insensitive, and ignoring the spacing around rdn separators
+        return re.sub(r"\s*([,=+])\s*", r"\1", dn.strip().lower())
+
+    def under(self, dn: str, base: str) -> bool:
+        dn, base = self.key(dn), self.key(base)
+        return (not base) or (dn == base) or dn.endswith(f",{base}")
+
+    def get(self, dn: str) -> str:
+
+        with self.lock:
+            cached_at, kind = self.kinds.get(self.key(dn), (None, None))
+
+            if (kind is None) or ((time.monotonic() - cached_at) >= self.ttl):
+                return None
+
+            return kind
+
+    def put(self, dn: str, kind: str):
+        with self.lock:
+            self.kinds[self.key(dn)] = (time.monotonic(), kind)
+
+    def may_be(self, dn: str, kind: str, base: str) -> bool:
+
+        # Once classified a dn is only searched for as its own kind, otherwise a dn can
+        # only be found under a base it sits beneath
+        cached = self.get(dn)
+        if cached is not None:
+            with self.lock:
+                self.stats["hits"] += 1
+            return cached == kind
+
+        if not self.under(dn, base):
+            with self.lock:
+                self.stats["ruled_out"] += 1
+            return False
+
+        return True
+
+    def report(self):
+
+        # Called as each cycle starts
+        with self.lock:
+            now = time.monotonic()
+            self.kinds = {key: entry for key, entry in self.kinds.items() if (now - entry[0]) < self.ttl}
+
+            logging.info(f"Dn cache {dict(self.stats)} with {len(self.kinds)} dn's")
+            self.stats.clear()
+
+    def invalidate(self, dns: list):
+
+        if not dns:
+            return
+
+        # Changed entries may be new, so anything classified unresolved is looked up again
+        with self.lock:
+            for dn in dns:
+                self.kinds.pop(self.key(dn), None)
+
+            self.kinds = {key: entry for key, entry in self.kinds.items() if entry[1] != UNRESOLVED}
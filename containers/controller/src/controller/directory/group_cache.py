@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+from collections import Counter
+
+
+class LDAPGroupCache:
+
+    ttl: float
+    groups: dict
+    filters: dict
+    stats: Counter
+    lock: threading.Lock
+
+    def __init__(self, ttl: float = 0):
+
+        # Entries live until the next cycle starts, or for ttl seconds when one is given
+        self.ttl = ttl
+
+        # Normalized group dn -> (time expanded, normalized user dn -> search record of every
+        # user nested under it, normalized dn's of every group it was flattened from or None
+        # when they are unknown, normalized member dn's of those groups whether or not they
+        # matched the user filter or None when they are unknown), every expansion requests the
+        # same attributes so the records serve any manifest
+        self.groups = dict()
+
+        # Group search filter -> (time searched, normalized dn's of the top level groups it matched)
+        self.filters = dict()
+
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(dn: str) -> str:
+        return dn.lower()
+
+    def fresh(self, cached_at: float) -> bool:
+        return (not self.ttl) or ((time.monotonic() - cached_at) < self.ttl)
+
+    def get_group(self, dn: str) -> tuple:
+
+        with self.lock:
+            cached_at, users, group_keys, member_keys = self.groups.get(self.key(dn), (None, None, None, None))
+
+            if (users is None) or not self.fresh(cached_at):
+                self.stats["misses"] += 1
+                return None
+
+            self.stats["hits"] += 1
+            return users, group_keys, member_keys
+
+    def put_group(self, dn: str, users: dict, group_keys: frozenset, member_keys: frozenset):
+        with self.lock:
+            self.groups[self.key(dn)] = (time.monotonic(), users, group_keys, member_keys)
+
+    def get_filter(self, search_filter: str) -> list:
+
+        with self.lock:
+            cached_at, group_keys = self.filters.get(search_filter, (None, None))
+
+            if (group_keys is None) or not self.fresh(cached_at):
+                return None
+
+            return group_keys
+
+    def put_filter(self, search_filter: str, group_keys: list):
+        with self.lock:
+            self.filters[search_filter] = (time.monotonic(), group_keys)
+
+    def report(self):
+
+        # Called as each cycle starts
+        with self.lock:
+            logging.info(f"Group cache {dict(self.stats)} with {len(self.groups)} groups and {len(self.filters)} filters")
+            self.stats.clear()
+
+    def expire(self):
+
+        # Without a ttl nothing carries over between cycles
+        with self.lock:
+            self.groups = {key: entry for key, entry in self.groups.items() if self.ttl and self.fresh(entry[0])}
+            self.filters = {key: entry for key, entry in self.filters.items() if self.ttl and self.fresh(entry[0])}
+
+    def clear(self):
+        with self.lock:
+            self.groups = dict()
+            self.filters = dict()
+
+    def invalidate(self, group_dns: list, user_dns: list):
+
+        changed_groups = set(map(self.key, group_dns))
+        changed_users = set(map(self.key, user_dns))
+
+        with self.lock:
+
+            # Drop every group flattened from a changed group, or with a changed user among its
+            # members, a user who did not match the user filter before may match it now. Groups
+            # flattened from unknown groups or members are dropped when any of those change
+            groups = {
+                key: entry for key, entry in self.groups.items()
+                if changed_groups.isdisjoint(entry[2] if entry[2] is not None else changed_groups)
+                and changed_users.isdisjoint(entry[3] if entry[3] is not None else changed_users)
+                and changed_users.isdisjoint(entry[1])
+            }
+
+            self.stats["invalidated"] += len(self.groups) - len(groups)
+            self.groups = groups
+
+            # A changed or new group may now match any filter
+            if changed_groups:
+                self.filters = dict()
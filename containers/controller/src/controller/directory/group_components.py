@@ -0,0 +1,63 @@
+import typing
+
+
+def ldap_group_components(members_by_group: typing.Dict[str, typing.List[str]]) -> typing.Dict[str, int]:
+
+    # Tarjan's strongly connected components over the groups nested in each other, groups
+    # that nest each other in a cycle share every member so they share one component.
+    # Components are numbered in the order they complete, so every component a group can
+    # reach is numbered before its own
+    index = dict()
+    low = dict()
+    stack = list()
+    on_stack = set()
+    components = dict()
+    count = 0
+
+    for root in members_by_group:
+        if root in index:
+            continue
+
+        # Walk without recursion, nesting can be deeper than the interpreter's recursion limit
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(members_by_group[root]))]
+
+        while work:
+            key, members = work[-1]
+
+            for member in members:
+
+                # Only groups take part, users and unknown dn's are leaves
+                if member not in members_by_group:
+                    continue
+
+                if member not in index:
+                    index[member] = low[member] = len(index)
+                    stack.append(member)
+                    on_stack.add(member)
+                    work.append((member, iter(members_by_group[member])))
+                    break
+
+                if member in on_stack:
+                    low[key] = min(low[key], index[member])
+
+            else:
+                work.pop()
+
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[key])
+
+                # The group is the root of a component, everything above it on the stack belongs to it
+                if low[key] == index[key]:
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        components[member] = count
+                        if member == key:
+                            break
+                    count += 1
+
+    return components
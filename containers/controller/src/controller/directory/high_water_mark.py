@@ -0,0 +1,24 @@
+import datetime
+
+from ldap3 import BASE, Connection
+
+
+def ldap_high_water_mark(
+    client: Connection,
+    attribute: str
+) -> str:
+
+    # Active Directory numbers every change, so read the highest number committed so far
+    if attribute == "uSNChanged":
+        client.search(
+            search_base="",
+            search_filter="(objectClass=*)",
+            search_scope=BASE,
+            attributes=["highestCommittedUSN"]
+        )
+        return str(client.response[0]["attributes"]["highestCommittedUSN"])
+
+    # Otherwise take the current time, set back to allow for clock skew with the directory
+    # as searching a change twice is harmless but missing one is not
+    now = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=5)
+    return now.strftime("%Y%m%d%H%M%SZ")
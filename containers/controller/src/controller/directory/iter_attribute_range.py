@@ -0,0 +1,47 @@
+import logging
+import typing
+from ldap3 import Connection, BASE
+
+
+def ldap_iter_attribute_range(
+    client: Connection,
+    entry: dict,
+    attribute: str
+) -> typing.Iterator[str]:
+
+    # Servers cap how many values of an attribute come back with an entry, Active Directory
+    # returns the first 1500 as attribute;range=0-1499 and the rest have to be requested
+    range_prefix = f"{attribute.lower()};range="
+    attributes = entry["attributes"]
+
+    while True:
+        ranged = [key for key in attributes if key.lower().startswith(range_prefix)]
+
+        # Small enough to have been returned whole
+        if not ranged:
+            yield from attributes.get(attribute, list())
+            return
+
+        # Values are yielded a range at a time, only the current range is held here
+        yield from attributes[ranged[0]]
+
+        # The final range is marked by an end of *
+        _, _, end = ranged[0][len(range_prefix):].partition("-")
+        if end == "*":
+            return
+
+        logging.debug(f"fetching dn={entry['dn']} {attribute};range={int(end) + 1}-*")
+
+        # The range options can't pass through ldap_iter_search which escapes attributes
+        client.search(
+            search_base=entry["dn"],
+            search_filter="(objectClass=*)",
+            search_scope=BASE,
+            attributes=[f"{attribute};range={int(end) + 1}-*"]
+        )
+
+        # The entry was removed part way through the walk
+        if not client.response:
+            return
+
+        attributes = client.response[0]["attributes"]
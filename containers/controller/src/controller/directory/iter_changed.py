@@ -0,0 +1,35 @@
+import typing
+
+from ldap3 import Connection, SUBTREE
+from ldap_filter import Filter
+
+from .iter_search import ldap_iter_search
+
+
+def ldap_iter_changed(
+    client: Connection,
+    base: str,
+    search_filter: str,
+    attribute: str,
+    high_water_mark: str,
+    paged_size: int
+) -> typing.Iterator[str]:
+
+    # The high water mark of a uSNChanged scan is the last change already seen
+    if attribute == "uSNChanged":
+        high_water_mark = str(int(high_water_mark) + 1)
+
+    changed_filter = Filter.AND([
+        Filter.parse(search_filter),
+        Filter.attribute(attribute).gte(high_water_mark)
+    ])
+
+    for record in ldap_iter_search(
+        client=client,
+        base=base,
+        scope=SUBTREE,
+        search_filter=changed_filter.to_string(),
+        attributes=[attribute],
+        paged_size=paged_size
+    ):
+        yield record["dn"]
@@ -1,11 +1,25 @@
 import logging
+import math
 import typing
 from ldap3 import Connection, SUBTREE
 from ldap_filter import Filter
 
+from .attribute_cache import LDAPAttributeCache
+from .dn_cache import GROUP, UNRESOLVED, USER, LDAPDnCache
+from .group_cache import LDAPGroupCache
+from .iter_attribute_range import ldap_iter_attribute_range
 from .iter_search import ldap_iter_search
 
 
+def ldap_dn_filter(dns: typing.List[str]) -> Filter:
+
+    # Build a filter for testing the search object's dn is equal to any of the given dn's
+    return Filter.OR([
+        Filter.attribute("distinguishedName").equal_to(dn)
+        for dn in dns
+    ])
+
+
 def ldap_iter_group_members(
     client: Connection,
     group_base: str,
@@ -16,13 +30,36 @@ def ldap_iter_group_members(
     member_attribute: str,
     attributes: typing.List[str],
     paged_size: int,
+    batch_size: int = 50,
+    cache: LDAPGroupCache = None,
+    dn_cache: LDAPDnCache = None,
+    attribute_cache: LDAPAttributeCache = None,
+    version_attribute: str = "modifyTimestamp",
     visited_dns: typing.Set[str] = None
 ):
 
+    # Without a shared cache the expansions are only reused within this call
+    if cache is None:
+        cache = LDAPGroupCache()
+
+    # Without a shared dn cache member dn's are only classified by their suffix
+    if dn_cache is None:
+        dn_cache = LDAPDnCache()
+
+    # Without a shared attribute cache every user's attributes are fetched
+    if attribute_cache is None:
+        attribute_cache = LDAPAttributeCache()
+
     # Initialize a dn cache if one doesn't exist
     if visited_dns is None:
         visited_dns = set()
 
+    # Record the kind of each search result before anything else filters it
+    def classify(records, kind: str):
+        for record in records:
+            dn_cache.put(record["dn"], kind)
+            yield record
+
     # Filter an iterator so repeated dn's are skipped
     def visit(record) -> bool:
         dn = record["dn"]
@@ -38,53 +75,193 @@ def ldap_iter_group_members(
     # Validate the filter for what is a valid group (further limited to under the group base)
     group_filter = Filter.parse(group_filter)
 
-    # Validate the top level group search filter (for this level of the recursion) with the
-    # global group_filter for what is a valid group
+    # Validate the top level group search filter with the global group_filter for what is a valid group
     group_search_filter = Filter.AND([group_filter, Filter.parse(group_search_filter)])
 
-    # Iterate over the top level groups that return in the group base from
-    # the group filter
-    for group in filter(visit, ldap_iter_search(
-        client=client,
-        base=group_base,
-        scope=SUBTREE,
-        search_filter=group_search_filter.to_string(),
-        attributes=[member_attribute],
-        paged_size=paged_size
-    )):
+    # Flattened users of groups taken from the cache or completed by this call, the immediate
+    # member dn's of the groups that had to be expanded, and the users found by this call
+    users_by_group = dict()
+    members_by_group = dict()
+    users_by_key = dict()
 
-        # Loop over the immediate members of the group under the group base
-        for member_dn in group["attributes"].get(member_attribute, list()):
+    # Every group nested under each group taken from the cache, and every member dn of those
+    # groups, so invalidating any of them drops the groups flattened from it
+    group_keys_by_group = dict()
+    member_keys_by_group = dict()
 
-            # Build a filter for testing the search object's dn is equal to the current member's dn
-            member_dn_filter = Filter.attribute("distinguishedName").equal_to(member_dn)
+    def add_groups(groups) -> list:
+        member_dns = list()
+        for group in groups:
+            key = cache.key(group["dn"])
 
-            # If the member DN is a group then yielding from the recursion will
-            # iterate over the nested members
+            cached = cache.get_group(group["dn"])
+            if cached is not None:
+                users_by_group[key], group_keys_by_group[key], member_keys_by_group[key] = cached
+                continue
 
-            yield from filter(visit, ldap_iter_group_members(
+            # Large groups return their members over several ranges. Every member dn of a group
+            # is kept until the walk ends since flattening revisits them, so a group's full
+            # membership is held in memory however it was retrieved
+            members_by_group[key] = list(ldap_iter_attribute_range(
                 client=client,
-                group_base=group_base,
-                group_filter=group_filter.to_string(),
-                group_search_filter=member_dn_filter.to_string(),
-                user_base=user_base,
-                user_filter=user_filter.to_string(),
-                member_attribute=member_attribute,
-                attributes=attributes,
-                paged_size=paged_size,
-                visited_dns=visited_dns
+                entry=group,
+                attribute=member_attribute
             ))
+            member_dns.extend(members_by_group[key])
 
-            # If the member DN is a person then yielding from the search under the
-            # user base will iterate once for the member
+        return member_dns
 
-            user_dn_filter = Filter.AND([user_filter, member_dn_filter])
+    # Reuse the top level groups last matched by the same filter while they are all cached,
+    # otherwise collect the top level groups that return in the group base from the group filter
+    top_group_keys = cache.get_filter(group_search_filter.to_string())
+    top_groups = list()
 
-            yield from filter(visit, ldap_iter_search(
-                client=client,
-                base=user_base,
-                scope=SUBTREE,
-                search_filter=user_dn_filter.to_string(),
-                attributes=attributes,
-                paged_size=paged_size
-            ))
+    # Only usable while every group it matched is still cached
+    cached_top_groups = [cache.get_group(key) for key in (top_group_keys or list())]
+
+    if (top_group_keys is not None) and all(cached_top_groups):
+        for key, cached in zip(top_group_keys, cached_top_groups):
+            users_by_group[key], group_keys_by_group[key], member_keys_by_group[key] = cached
+
+    else:
+        top_groups = list(filter(visit, ldap_iter_search(
+            client=client,
+            base=group_base,
+            scope=SUBTREE,
+            search_filter=group_search_filter.to_string(),
+            attributes=[member_attribute],
+            paged_size=paged_size
+        )))
+
+        top_group_keys = [cache.key(group["dn"]) for group in top_groups]
+        cache.put_filter(group_search_filter.to_string(), top_group_keys)
+
+    member_dns = add_groups(top_groups)
+
+    # Resolve the members one level of nesting at a time, each batch of member dn's costs
+    # one search for groups and one for users rather than two searches per member
+    while member_dns:
+
+        member_dns = list(dict.fromkeys(
+            dn for dn in member_dns
+            if (dn not in visited_dns) and (cache.key(dn) not in members_by_group) and (cache.key(dn) not in users_by_group)
+        ))
+        nested_member_dns = list()
+
+        for offset in range(0, len(member_dns), batch_size):
+            batch_dns = member_dns[offset:offset + batch_size]
+
+            # A dn is only looked up as the kind it was last classified as, or under a base it
+            # sits beneath, so most members cost one search and unresolved ones cost none
+            group_dns = [dn for dn in batch_dns if dn_cache.may_be(dn, GROUP, group_base)]
+            user_dns = [dn for dn in batch_dns if dn_cache.may_be(dn, USER, user_base)]
+
+            # Member dn's that are groups are taken from the cache or have their own members
+            # resolved in the next round, groups are visited before users so a dn is only
+            # ever handled once
+            if group_dns:
+                nested_member_dns.extend(add_groups(filter(visit, classify(ldap_iter_search(
+                    client=client,
+                    base=group_base,
+                    scope=SUBTREE,
+                    search_filter=Filter.AND([group_filter, ldap_dn_filter(group_dns)]).to_string(),
+                    attributes=[member_attribute],
+                    paged_size=paged_size
+                ), GROUP))))
+
+            # Member dn's that are people under the user base are recorded once per member,
+            # resolving membership only needs their dn and the version of their entry
+            stale_user_dns = list()
+            if user_dns:
+                for user in filter(visit, classify(ldap_iter_search(
+                    client=client,
+                    base=user_base,
+                    scope=SUBTREE,
+                    search_filter=Filter.AND([user_filter, ldap_dn_filter(user_dns)]).to_string(),
+                    attributes=[version_attribute],
+                    paged_size=paged_size
+                ), USER)):
+                    record = attribute_cache.get(
+                        user["dn"], user["attributes"].get(version_attribute), attributes
+                    )
+
+                    if record is None:
+                        stale_user_dns.append(user["dn"])
+                    else:
+                        users_by_key[cache.key(user["dn"])] = record
+
+            # Only users new to the cache, or changed since they were cached, have their
+            # attributes fetched
+            if stale_user_dns:
+                for user in ldap_iter_search(
+                    client=client,
+                    base=user_base,
+                    scope=SUBTREE,
+                    search_filter=Filter.AND([user_filter, ldap_dn_filter(stale_user_dns)]).to_string(),
+                    attributes=[version_attribute, *attributes],
+                    paged_size=paged_size
+                ):
+                    attribute_cache.put(
+                        user["dn"], user["attributes"].get(version_attribute), attributes, user
+                    )
+                    users_by_key[cache.key(user["dn"])] = user
+
+            # Members found as neither are skipped until their classification expires
+            for dn in batch_dns:
+                if dn_cache.get(dn) is None:
+                    dn_cache.put(dn, UNRESOLVED)
+
+        member_dns = nested_member_dns
+
+    def flatten(key: str, depth: int, stack: dict):
+
+        if key in users_by_group:
+            return users_by_group[key], group_keys_by_group[key], member_keys_by_group[key], math.inf
+
+        # A cycle back to a group still being flattened, its members are gathered by that frame
+        if key in stack:
+            return dict(), frozenset(), frozenset(), stack[key]
+
+        stack[key] = depth
+
+        users = dict()
+        group_keys = {key}
+        member_keys = set()
+        low = math.inf
+        for member_dn in members_by_group[key]:
+            member_key = cache.key(member_dn)
+            member_keys.add(member_key)
+
+            if (member_key in members_by_group) or (member_key in users_by_group):
+                nested_users, nested_group_keys, nested_member_keys, nested_low = flatten(member_key, depth + 1, stack)
+                users.update(nested_users)
+                group_keys.update(nested_group_keys)
+                member_keys.update(nested_member_keys)
+                low = min(low, nested_low)
+
+            elif member_key in users_by_key:
+                users[member_key] = users_by_key[member_key]
+
+        del stack[key]
+
+        # Only cache groups whose members were all gathered, a group inside a cycle that
+        # leads back above it is missing the members collected further up the stack
+        group_keys = frozenset(group_keys)
+        member_keys = frozenset(member_keys)
+        if low >= depth:
+            users_by_group[key] = users
+            group_keys_by_group[key] = group_keys
+            member_keys_by_group[key] = member_keys
+            cache.put_group(key, users, group_keys, member_keys)
+
+        return users, group_keys, member_keys, low
+
+    # Iterate once over every user nested under the top level groups
+    yielded_keys = set()
+    for key in top_group_keys:
+        users, _, _, _ = flatten(key, 0, dict())
+
+        for user_key in sorted(set(users) - yielded_keys):
+            yield users[user_key]
+
+        yielded_keys.update(users)
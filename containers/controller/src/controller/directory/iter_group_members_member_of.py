@@ -0,0 +1,134 @@
+import logging
+import typing
+from ldap3 import Connection, SUBTREE
+from ldap_filter import Filter
+
+from .group_cache import LDAPGroupCache
+from .iter_search import ldap_iter_search
+
+# Active Directory's LDAP_MATCHING_RULE_IN_CHAIN, matches memberOf through every level of nesting
+LDAP_MATCHING_RULE_IN_CHAIN = "1.2.840.113556.1.4.1941"
+
+
+def ldap_member_of_filter(dns: typing.List[str], in_chain: bool = False) -> Filter:
+
+    # Build a filter for testing the search object is a member of any of the given group dn's
+    attribute = f"memberOf:{LDAP_MATCHING_RULE_IN_CHAIN}:" if in_chain else "memberOf"
+    return Filter.OR([
+        Filter.attribute(attribute).equal_to(dn)
+        for dn in dns
+    ])
+
+
+def ldap_iter_group_members_member_of(
+    client: Connection,
+    group_base: str,
+    group_filter: str,
+    group_search_filter: str,
+    user_base: str,
+    user_filter: str,
+    attributes: typing.List[str],
+    paged_size: int,
+    batch_size: int = 50,
+    cache: LDAPGroupCache = None,
+    in_chain: bool = False
+):
+
+    # Without a shared cache the expansions are only reused within this call
+    if cache is None:
+        cache = LDAPGroupCache()
+
+    # Validate the filter for what is a valid user (further limited to under the user base)
+    user_filter = Filter.parse(user_filter)
+
+    # Validate the filter for what is a valid group (further limited to under the group base)
+    group_filter = Filter.parse(group_filter)
+
+    # Validate the top level group search filter with the global group_filter for what is a valid group
+    group_search_filter = Filter.AND([group_filter, Filter.parse(group_search_filter)])
+
+    # Reuse the top level groups last matched by the same filter, otherwise collect the top
+    # level groups that return in the group base from the group filter, only their dn's are needed
+    top_group_keys = cache.get_filter(group_search_filter.to_string())
+
+    if top_group_keys is None:
+        top_group_keys = list(dict.fromkeys(
+            cache.key(group["dn"])
+            for group in ldap_iter_search(
+                client=client,
+                base=group_base,
+                scope=SUBTREE,
+                search_filter=group_search_filter.to_string(),
+                attributes=list(),
+                paged_size=paged_size
+            )
+        ))
+
+        cache.put_filter(group_search_filter.to_string(), top_group_keys)
+
+    def expand(key: str) -> tuple:
+
+        users = dict()
+        group_keys = {key}
+
+        # Groups at the current level of nesting, in chain matching resolves every level
+        # within the server so only the top level group is ever searched for
+        group_dns = [key]
+        while group_dns:
+            nested_group_dns = list()
+
+            for offset in range(0, len(group_dns), batch_size):
+                member_of_filter = ldap_member_of_filter(group_dns[offset:offset + batch_size], in_chain=in_chain)
+
+                for user in ldap_iter_search(
+                    client=client,
+                    base=user_base,
+                    scope=SUBTREE,
+                    search_filter=Filter.AND([user_filter, member_of_filter]).to_string(),
+                    attributes=attributes,
+                    paged_size=paged_size
+                ):
+                    users[cache.key(user["dn"])] = user
+
+                if in_chain:
+                    continue
+
+                # A memberOf overlay only records direct memberships, so nested groups are
+                # found through their own memberOf and searched in the next round
+                for group in ldap_iter_search(
+                    client=client,
+                    base=group_base,
+                    scope=SUBTREE,
+                    search_filter=Filter.AND([group_filter, member_of_filter]).to_string(),
+                    attributes=list(),
+                    paged_size=paged_size
+                ):
+                    group_key = cache.key(group["dn"])
+                    if group_key in group_keys:
+                        logging.debug(f"skipping dn={group['dn']}")
+                        continue
+
+                    group_keys.add(group_key)
+                    nested_group_dns.append(group_key)
+
+            group_dns = nested_group_dns
+
+        # The groups nested under an in chain search are never seen, so any group changing
+        # invalidates it, and members are only seen once they match so any user changing does
+        return users, (None if in_chain else frozenset(group_keys)), None
+
+    # Iterate once over every user nested under the top level groups
+    yielded_keys = set()
+    for key in top_group_keys:
+
+        cached = cache.get_group(key)
+        if cached is None:
+            cached = expand(key)
+            cache.put_group(key, *cached)
+
+        users, _, _ = cached
+
+        for user_key in sorted(set(users) - yielded_keys):
+            yield users[user_key]
+
+        yielded_keys.update(users)
@@ -0,0 +1,38 @@
+import logging
+import typing
+
+# Each worker process expands groups over its own LDAP wrapper, with its own connections
+# and caches, kept between the manifests it is handed
+state = dict()
+
+
+def ldap_init_process(settings: dict):
+
+    from .wrapper import LDAP
+
+    logging.info("Starting ldap expansion process")
+    state["ldap"] = LDAP(**settings)
+    state["cycle"] = None
+
+
+def ldap_expand_in_process(
+    cycle: int,
+    group_search_filter: str,
+    attributes: typing.List[str]
+) -> typing.List[tuple]:
+
+    ldap = state["ldap"]
+
+    # Follow the parent into each new cycle before expanding anything in it
+    if state["cycle"] != cycle:
+        ldap.expire_cache()
+        state["cycle"] = cycle
+
+    # Only the dn and the requested attributes are sent back to the parent
+    return [
+        (user["dn"], {attribute: user["attributes"].get(attribute) for attribute in attributes})
+        for user in ldap.iter_group_members(
+            group_search_filter=group_search_filter,
+            attributes=attributes
+        )
+    ]
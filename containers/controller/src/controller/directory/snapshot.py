@@ -0,0 +1,202 @@
+import logging
+import threading
+import typing
+from ldap3 import Connection, SUBTREE
+from ldap_filter import Filter
+
+from .group_cache import LDAPGroupCache
+from .group_components import ldap_group_components
+from .iter_attribute_range import ldap_iter_attribute_range
+from .iter_search import ldap_iter_search
+
+
+class LDAPSnapshot:
+
+    state: dict
+    lock: threading.Lock
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+
+        # Called as each cycle starts, the next expansion scans the directory again
+        with self.lock:
+            self.state = None
+
+    def scan(
+        self,
+        client: Connection,
+        group_base: str,
+        group_filter: str,
+        user_base: str,
+        user_filter: str,
+        member_attribute: str,
+        attributes: typing.List[str],
+        paged_size: int
+    ):
+
+        # Every group with its members, and every user with the attributes the manifests need,
+        # costs one paged search each however the groups are nested
+        logging.info(f"Scanning ldap groups under {group_base=}")
+        members_by_group = dict()
+        for group in ldap_iter_search(
+            client=client,
+            base=group_base,
+            scope=SUBTREE,
+            search_filter=group_filter,
+            attributes=[member_attribute],
+            paged_size=paged_size
+        ):
+            members_by_group[LDAPGroupCache.key(group["dn"])] = list(dict.fromkeys(map(
+                LDAPGroupCache.key,
+                ldap_iter_attribute_range(client=client, entry=group, attribute=member_attribute)
+            )))
+
+        logging.info(f"Scanning ldap users under {user_base=}")
+        users_by_key = {
+            LDAPGroupCache.key(user["dn"]): user
+            for user in ldap_iter_search(
+                client=client,
+                base=user_base,
+                scope=SUBTREE,
+                search_filter=user_filter,
+                attributes=attributes,
+                paged_size=paged_size
+            )
+        }
+
+        components = ldap_group_components(members_by_group)
+
+        groups_by_component = dict()
+        for key, component in components.items():
+            groups_by_component.setdefault(component, list()).append(key)
+
+        logging.info(
+            f"Scanned {len(members_by_group)} groups in {len(groups_by_component)} components "
+            f"and {len(users_by_key)} users"
+        )
+
+        # Swapped in whole, so expansions already holding the last scan finish with it. Group
+        # key -> component of the groups nesting each other in a cycle, and the flattened
+        # user keys of each component closed so far
+        self.state = dict(
+            members_by_group=members_by_group,
+            users_by_key=users_by_key,
+            attributes=set(attributes),
+            components=components,
+            groups_by_component=groups_by_component,
+            closures=dict()
+        )
+
+    @staticmethod
+    def close(state: dict, component: int) -> frozenset:
+
+        members_by_group = state["members_by_group"]
+        users_by_key = state["users_by_key"]
+        components = state["components"]
+        groups_by_component = state["groups_by_component"]
+        closures = state["closures"]
+
+        # Find every component reachable from this one that is still to be closed, without
+        # recursion as nesting can be deeper than the interpreter's recursion limit
+        pending = {component} if component not in closures else set()
+        stack = list(pending)
+        while stack:
+            for key in groups_by_component[stack.pop()]:
+                for member in members_by_group[key]:
+                    nested = components.get(member)
+                    if (nested is not None) and (nested not in closures) and (nested not in pending):
+                        pending.add(nested)
+                        stack.append(nested)
+
+        # Components are numbered in the order they completed, so every component nested
+        # under another is closed before it. Every group in a component has the same
+        # members, closed once from the direct users of its groups and the closures of
+        # the components they nest
+        for pending_component in sorted(pending):
+            users = set()
+            for key in groups_by_component[pending_component]:
+                for member in members_by_group[key]:
+                    nested = components.get(member)
+
+                    if nested is None:
+                        if member in users_by_key:
+                            users.add(member)
+
+                    elif nested != pending_component:
+                        users.update(closures[nested])
+
+            closures[pending_component] = frozenset(users)
+
+        return closures[component]
+
+    def iter_group_members(
+        self,
+        client: Connection,
+        group_base: str,
+        group_filter: str,
+        group_search_filter: str,
+        user_base: str,
+        user_filter: str,
+        member_attribute: str,
+        attributes: typing.List[str],
+        paged_size: int,
+        cache: LDAPGroupCache = None
+    ):
+
+        # Without a shared cache the top level groups are only reused within this call
+        if cache is None:
+            cache = LDAPGroupCache()
+
+        # Only scanning and swapping the snapshot hold the lock, expansions of different
+        # manifests read it concurrently
+        with self.lock:
+
+            # Scan again when a manifest needs an attribute the last scan didn't fetch
+            if (self.state is None) or not self.state["attributes"].issuperset(attributes):
+                self.scan(
+                    client=client,
+                    group_base=group_base,
+                    group_filter=group_filter,
+                    user_base=user_base,
+                    user_filter=user_filter,
+                    member_attribute=member_attribute,
+                    attributes=sorted(set(attributes).union(self.state["attributes"] if self.state else set())),
+                    paged_size=paged_size
+                )
+
+            state = self.state
+
+        # Validate the top level group search filter with the global group_filter for what is a valid group
+        group_search_filter = Filter.AND([Filter.parse(group_filter), Filter.parse(group_search_filter)])
+
+        # The manifest's filter may test any attribute of a group, so the top level groups
+        # are still found by the directory, only their dn's are needed
+        top_group_keys = cache.get_filter(group_search_filter.to_string())
+
+        if top_group_keys is None:
+            top_group_keys = list(dict.fromkeys(
+                cache.key(group["dn"])
+                for group in ldap_iter_search(
+                    client=client,
+                    base=group_base,
+                    scope=SUBTREE,
+                    search_filter=group_search_filter.to_string(),
+                    attributes=list(),
+                    paged_size=paged_size
+                )
+            ))
+
+            cache.put_filter(group_search_filter.to_string(), top_group_keys)
+
+        # Groups created since the scan are picked up by the next cycle
+        user_keys = set()
+        for key in top_group_keys:
+            if key in state["components"]:
+                user_keys.update(self.close(state, state["components"][key]))
+
+        # Iterate once over every user nested under the top level groups
+        for user_key in sorted(user_keys):
+            yield state["users_by_key"][user_key]
@@ -0,0 +1,69 @@
+from .group_components import ldap_group_components
+from .snapshot import LDAPSnapshot
+
+
+def build_state(members_by_group: dict, user_keys: list) -> dict:
+
+    components = ldap_group_components(members_by_group)
+
+    groups_by_component = dict()
+    for key, component in components.items():
+        groups_by_component.setdefault(component, list()).append(key)
+
+    return dict(
+        members_by_group=members_by_group,
+        users_by_key={key: dict(dn=key) for key in user_keys},
+        attributes=set(),
+        components=components,
+        groups_by_component=groups_by_component,
+        closures=dict()
+    )
+
+
+def test_groups_in_a_cycle_share_a_component():
+
+    components = ldap_group_components({
+        "a": ["b", "u1"],
+        "b": ["c", "u2"],
+        "c": ["a"],
+        "d": ["a", "u3"]
+    })
+
+    assert components["a"] == components["b"] == components["c"]
+    assert components["d"] != components["a"]
+
+    # Nested components complete before the components nesting them
+    assert components["a"] < components["d"]
+
+
+def test_close_gathers_every_member_across_a_cycle():
+
+    state = build_state(
+        members_by_group={
+            "a": ["b", "u1"],
+            "b": ["a", "u2", "x"],
+            "c": ["a", "u3"],
+            "e": ["e", "u4"]
+        },
+        user_keys=["u1", "u2", "u3", "u4"]
+    )
+
+    components = state["components"]
+
+    # Unknown member dn's are ignored and a group nesting itself is closed over its own members
+    assert LDAPSnapshot.close(state, components["a"]) == {"u1", "u2"}
+    assert LDAPSnapshot.close(state, components["b"]) == {"u1", "u2"}
+    assert LDAPSnapshot.close(state, components["c"]) == {"u1", "u2", "u3"}
+    assert LDAPSnapshot.close(state, components["e"]) == {"u4"}
+
+
+def test_close_handles_nesting_deeper_than_the_recursion_limit():
+
+    depth = 5000
+    members_by_group = {f"g{index}": [f"g{index + 1}", f"u{index}"] for index in range(depth)}
+    members_by_group[f"g{depth}"] = ["g0"]
+
+    state = build_state(members_by_group, user_keys=[f"u{index}" for index in range(depth)])
+
+    assert len(set(state["components"].values())) == 1
+    assert len(LDAPSnapshot.close(state, state["components"]["g0"])) == depth
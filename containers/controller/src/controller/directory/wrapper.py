@@ -1,8 +1,23 @@
+import logging
+import multiprocessing
+import threading
+import time
 import typing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 
 from ldap3 import Connection
 
+from .attribute_cache import LDAPAttributeCache
+from .connection_pool import LDAPConnectionPool
+from .dn_cache import LDAPDnCache
+from .group_cache import LDAPGroupCache
+from .high_water_mark import ldap_high_water_mark
+from .iter_changed import ldap_iter_changed
 from .iter_group_members import ldap_iter_group_members
+from .iter_group_members_member_of import ldap_iter_group_members_member_of
+from .process_pool import ldap_expand_in_process, ldap_init_process
+from .snapshot import LDAPSnapshot
 from .authenticate_user import ldap_authenticate_user
 
 
@@ -21,7 +36,21 @@ class LDAP:
     search_bind_dn: str
     search_bind_password: str
     paged_size: int
-    client: Connection
+    batch_size: int
+    expansion_strategy: str
+    group_cache: LDAPGroupCache
+    dn_cache: LDAPDnCache
+    attribute_cache: LDAPAttributeCache
+    snapshot: LDAPSnapshot
+    incremental_attribute: str
+    full_rescan_interval: float
+    high_water_mark: str
+    last_full_rescan: float
+    pool: LDAPConnectionPool
+    executor: ThreadPoolExecutor
+    processes: ProcessPoolExecutor
+    cycle: int
+    lock: threading.Lock
 
     def __init__(
         self,
@@ -37,7 +66,16 @@ class LDAP:
         member_attribute: str,
         username: str,
         password: str,
-        paged_size: int
+        paged_size: int,
+        batch_size: int = 50,
+        cache_ttl: float = 0,
+        incremental_attribute: str = None,
+        full_rescan_interval: float = 3600,
+        expansion_strategy: str = "recursive",
+        dn_cache_ttl: float = 3600,
+        attribute_cache_size: int = 100000,
+        pool_size: int = 4,
+        processes: int = 0
     ):
 
         self.hostname = hostname
@@ -53,21 +91,160 @@ class LDAP:
         self.username = username
         self.password = password
         self.paged_size = paged_size
+        self.batch_size = batch_size
 
-        self.client = ldap_authenticate_user(
-            hostname=self.hostname,
-            port=self.port,
-            username=self.username,
-            password=self.password
+        # Groups are either walked member by member (recursive), or their members found by
+        # searching the user base on memberOf, resolved through every level of nesting by the
+        # server (in-chain, Active Directory) or level by level (member-of, OpenLDAP overlay),
+        # or by scanning every group and user once a cycle and closing them in memory (snapshot)
+        self.expansion_strategy = expansion_strategy
+        self.snapshot = LDAPSnapshot()
+
+        # Flattened members of each group, shared by every manifest expanded in a cycle
+        self.group_cache = LDAPGroupCache(ttl=cache_ttl)
+
+        # Whether each member dn is a user, a group or neither, kept across cycles
+        self.dn_cache = LDAPDnCache(ttl=dn_cache_ttl)
+
+        # Attributes of recently seen users, only fetched again once their entry changes
+        self.attribute_cache = LDAPAttributeCache(max_size=attribute_cache_size)
+
+        # With an incremental attribute the cache carries over between cycles, patched by
+        # the groups and users changed since the high water mark, and rebuilt from scratch
+        # every full_rescan_interval seconds
+        self.incremental_attribute = incremental_attribute
+        self.full_rescan_interval = full_rescan_interval
+        self.high_water_mark = None
+        self.last_full_rescan = None
+
+        # Connections are not thread safe, so each concurrent expansion takes its own bound
+        # connection from the pool, with as many manifests expanded at once as connections
+        self.pool = LDAPConnectionPool(
+            connect=partial(
+                ldap_authenticate_user,
+                hostname=self.hostname,
+                port=self.port,
+                username=self.username,
+                password=self.password
+            ),
+            size=pool_size
         )
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="ldap")
+
+        # Guards the high water mark of incremental refreshes
+        self.lock = threading.Lock()
+
+        # Bind once up front so bad credentials fail on startup
+        self.pool.run(lambda client: client.bound)
+
+        # Decoding responses and flattening groups is pure python, so with processes the
+        # expansions run in worker processes each with their own connections and caches,
+        # spawned rather than forked from a parent already running threads
+        self.cycle = 0
+        self.processes = None
+
+        # A snapshot or incremental deltas are built once and shared by every expansion, worker
+        # processes would each rebuild their own, so those expansions stay on threads
+        if processes and ((expansion_strategy == "snapshot") or (incremental_attribute is not None)):
+            logging.warning(f"Ignoring {processes=} as {expansion_strategy=} {incremental_attribute=} expand on threads")
+            processes = 0
+
+        if processes:
+            self.processes = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=ldap_init_process,
+                initargs=(dict(
+                    hostname=hostname,
+                    port=port,
+                    user_base=user_base,
+                    user_filter=user_filter,
+                    username_attribute=username_attribute,
+                    fullname_attribute=fullname_attribute,
+                    email_attribute=email_attribute,
+                    group_base=group_base,
+                    group_filter=group_filter,
+                    member_attribute=member_attribute,
+                    username=username,
+                    password=password,
+                    paged_size=paged_size,
+                    batch_size=batch_size,
+                    cache_ttl=cache_ttl,
+                    incremental_attribute=incremental_attribute,
+                    full_rescan_interval=full_rescan_interval,
+                    expansion_strategy=expansion_strategy,
+                    dn_cache_ttl=dn_cache_ttl,
+                    attribute_cache_size=attribute_cache_size,
+                    pool_size=1
+                ),)
+            )
 
     def iter_group_members(
         self,
         group_search_filter: str,
         attributes: typing.List[str]
     ):
+
+        if self.processes is not None:
+            users = self.processes.submit(
+                ldap_expand_in_process,
+                cycle=self.cycle,
+                group_search_filter=group_search_filter,
+                attributes=attributes
+            ).result()
+
+            for dn, user_attributes in users:
+                yield dict(dn=dn, attributes=user_attributes)
+            return
+
+        # The users are gathered before any are yielded so an expansion interrupted by a
+        # dropped connection can be started again on a new one
+        yield from self.pool.run(lambda client: list(self.expand_group_members(
+            client=client,
+            group_search_filter=group_search_filter,
+            attributes=attributes
+        )))
+
+    def expand_group_members(
+        self,
+        client: Connection,
+        group_search_filter: str,
+        attributes: typing.List[str]
+    ):
+
+        if self.expansion_strategy == "snapshot":
+            yield from self.snapshot.iter_group_members(
+                client=client,
+                group_base=self.group_base,
+                group_filter=self.group_filter,
+                group_search_filter=group_search_filter,
+                user_base=self.user_base,
+                user_filter=self.user_filter,
+                member_attribute=self.member_attribute,
+                attributes=attributes,
+                paged_size=self.paged_size,
+                cache=self.group_cache
+            )
+            return
+
+        if self.expansion_strategy in ("in-chain", "member-of"):
+            yield from ldap_iter_group_members_member_of(
+                client=client,
+                group_base=self.group_base,
+                group_filter=self.group_filter,
+                group_search_filter=group_search_filter,
+                user_base=self.user_base,
+                user_filter=self.user_filter,
+                attributes=attributes,
+                paged_size=self.paged_size,
+                batch_size=self.batch_size,
+                cache=self.group_cache,
+                in_chain=(self.expansion_strategy == "in-chain")
+            )
+            return
+
         yield from ldap_iter_group_members(
-            client=self.client,
+            client=client,
             group_base=self.group_base,
             group_filter=self.group_filter,
             group_search_filter=group_search_filter,
@@ -75,5 +252,75 @@ class LDAP:
             user_filter=self.user_filter,
             member_attribute=self.member_attribute,
             attributes=attributes,
-            paged_size=self.paged_size
+            paged_size=self.paged_size,
+            batch_size=self.batch_size,
+            cache=self.group_cache,
+            dn_cache=self.dn_cache,
+            attribute_cache=self.attribute_cache,
+            version_attribute=self.incremental_attribute or "modifyTimestamp"
+        )
+
+    def expire_cache(self):
+
+        # Worker processes expire their own caches as the first expansion of a cycle reaches them
+        self.cycle += 1
+        if self.processes is not None:
+            return
+
+        self.group_cache.report()
+        self.dn_cache.report()
+        self.attribute_cache.report()
+        self.snapshot.clear()
+
+        if self.incremental_attribute is None:
+            self.group_cache.expire()
+            return
+
+        with self.lock:
+            self.pool.run(self.refresh_cache)
+
+    def refresh_cache(self, client: Connection):
+
+        # Take the mark before reading anything so changes made during the scan are
+        # picked up by the next one
+        high_water_mark = ldap_high_water_mark(
+            client=client,
+            attribute=self.incremental_attribute
         )
+
+        full_rescan = (self.last_full_rescan is None) or \
+            ((time.monotonic() - self.last_full_rescan) >= self.full_rescan_interval)
+
+        if full_rescan:
+            logging.info(f"Full ldap rescan from {high_water_mark=}")
+            self.group_cache.clear()
+            self.last_full_rescan = time.monotonic()
+
+        else:
+            changed_group_dns = list(ldap_iter_changed(
+                client=client,
+                base=self.group_base,
+                search_filter=self.group_filter,
+                attribute=self.incremental_attribute,
+                high_water_mark=self.high_water_mark,
+                paged_size=self.paged_size
+            ))
+
+            changed_user_dns = list(ldap_iter_changed(
+                client=client,
+                base=self.user_base,
+                search_filter=self.user_filter,
+                attribute=self.incremental_attribute,
+                high_water_mark=self.high_water_mark,
+                paged_size=self.paged_size
+            ))
+
+            logging.info(
+                f"Found {len(changed_group_dns)} groups and {len(changed_user_dns)} users "
+                f"changed since {self.high_water_mark=}"
+            )
+
+            self.group_cache.invalidate(group_dns=changed_group_dns, user_dns=changed_user_dns)
+            self.dn_cache.invalidate(changed_group_dns + changed_user_dns)
+
+        self.high_water_mark = high_water_mark
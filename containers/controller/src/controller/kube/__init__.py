@@ -1,2 +1,14 @@
 from .iter_objects import kube_iter_objects
 from .iter_objects import kube_gather_objects
+from .iter_objects import kube_list_objects
+from .iter_objects import kube_object_name
+from .iter_objects import kube_project_object
+from .client import kube_api_client
+from .cache import KubeObjectCache
+from .patch_object_status import kube_patch_object_status
+from .leases import kube_get_lease
+from .leases import kube_delete_lease
+from .leases import kube_hold_lease
+from .leases import kube_lease_expired
+from .leases import kube_list_leases
+from .lease_members import KubeLeaseMembers
@@ -0,0 +1,233 @@
+import logging
+import threading
+import time
+
+import kubernetes as k8s
+
+from .client import kube_api_client
+from .iter_objects import kube_list_objects, kube_object_name, kube_project_object
+
+
+class KubeObjectCache:
+
+    group: str
+    version: str
+    plural: str
+    namespaces: list
+    label_selector: str
+    watch_timeout: int
+    limit: int
+    objects: dict
+    resource_versions: dict
+    changed: set
+    condition: threading.Condition
+
+    def __init__(
+        self,
+        group: str,
+        version: str,
+        plural: str,
+        namespaces: list = None,
+        label_selector: str = None,
+        watch_timeout: int = 300,
+        limit: int = 500
+    ):
+
+        self.group = group
+        self.version = version
+        self.plural = plural
+
+        # One list and watch per namespace in the allow-list, or a single cluster-wide
+        # one when no namespaces are given, all feeding the same cache
+        self.namespaces = list(namespaces) if namespaces else [None]
+        self.label_selector = label_selector
+        self.watch_timeout = watch_timeout
+        self.limit = limit
+
+        self.objects = dict()
+        self.resource_versions = {namespace: None for namespace in self.namespaces}
+
+        # Names of objects created, changed or deleted since the last wait_for_changes
+        self.changed = set()
+        self.condition = threading.Condition()
+
+    def start(self):
+
+        # Populate the cache before returning so the first sync sees every object
+        for namespace in self.namespaces:
+            self.relist(namespace)
+
+        for namespace in self.namespaces:
+            threading.Thread(
+                target=self.watch_forever,
+                args=(namespace,),
+                name=f"kube-watch-{namespace or 'cluster'}",
+                daemon=True
+            ).start()
+
+    def snapshot(self) -> dict:
+        with self.condition:
+            return dict(self.objects)
+
+    def relist(self, namespace: str = None):
+
+        logging.info(f"Listing {self.plural} in {namespace=} {self.label_selector=}")
+        manifests = kube_list_objects(
+            group=self.group,
+            version=self.version,
+            namespace=namespace,
+            plural=self.plural,
+            label_selector=self.label_selector,
+            limit=self.limit
+        )
+
+        objects = dict()
+        for manifest in manifests["items"]:
+            name = kube_object_name(manifest)
+
+            if name in objects:
+                ex = ValueError(("Manifest with duplicate name!", name, manifest, objects[name]))
+                logging.exception("Manifest with duplicate name!", exc_info=ex)
+                raise ex
+
+            objects[name] = manifest
+
+        with self.condition:
+
+            # Only the objects from the relisted namespace are replaced
+            previous = {
+                name: manifest for name, manifest in self.objects.items()
+                if (namespace is None) or (manifest["metadata"]["namespace"] == namespace)
+            }
+
+            # Anything that appeared, disappeared or changed while the watch was
+            # down is treated as an event
+            self.changed.update(
+                name for name in (set(previous) | set(objects))
+                if self.generation(previous.get(name)) != self.generation(objects.get(name))
+            )
+
+            for name in previous:
+                del self.objects[name]
+
+            self.objects.update(objects)
+            self.resource_versions[namespace] = manifests["metadata"]["resourceVersion"]
+            self.condition.notify_all()
+
+        logging.info(f"Found {len(objects)} {self.plural} in {namespace=} at {self.resource_versions[namespace]=}")
+
+    @staticmethod
+    def generation(manifest: dict):
+        if manifest is None:
+            return None
+        return manifest["metadata"].get("generation")
+
+    def watch_forever(self, namespace: str = None):
+
+        while True:
+            try:
+                # Start again from a fresh list when there is no resource version to resume from
+                if self.resource_versions[namespace] is None:
+                    self.relist(namespace)
+
+                self.watch(namespace)
+
+            except k8s.client.exceptions.ApiException as ex:
+
+                # The resource version or list continue token is too old to resume from
+                if ex.status == 410:
+                    logging.info(f"Watch of {self.plural} in {namespace=} expired, relisting")
+                    self.resource_versions[namespace] = None
+                    continue
+
+                logging.exception("Watch failed!", exc_info=ex)
+                time.sleep(5)
+
+            except Exception as ex:
+                logging.exception("Watch failed!", exc_info=ex)
+                time.sleep(5)
+
+    def watch(self, namespace: str = None):
+
+        crds = k8s.client.api.CustomObjectsApi(kube_api_client())
+
+        kwargs = dict(
+            group=self.group,
+            version=self.version,
+            plural=self.plural,
+            resource_version=self.resource_versions[namespace],
+            allow_watch_bookmarks=True,
+            timeout_seconds=self.watch_timeout
+        )
+
+        if self.label_selector:
+            kwargs["label_selector"] = self.label_selector
+
+        # Resume from the last seen resource version, the server ends the stream after
+        # watch_timeout seconds and the next call picks up where it left off
+        if namespace is None:
+            stream = k8s.watch.Watch().stream(crds.list_cluster_custom_object, **kwargs)
+        else:
+            stream = k8s.watch.Watch().stream(crds.list_namespaced_custom_object, namespace=namespace, **kwargs)
+
+        for event in stream:
+            self.handle(namespace, event["type"], event["raw_object"])
+
+    def handle(self, namespace: str, event_type: str, manifest: dict):
+
+        with self.condition:
+
+            self.resource_versions[namespace] = manifest["metadata"]["resourceVersion"]
+
+            if event_type == "BOOKMARK":
+                return
+
+            name = kube_object_name(manifest)
+            logging.debug(f"Watch event {event_type} {name=}")
+
+            if event_type == "DELETED":
+                self.objects.pop(name, None)
+                self.changed.add(name)
+
+            else:
+                manifest = kube_project_object(manifest)
+
+                # Writes to the status subresource do not bump the generation, so the
+                # controller's own status updates do not trigger another reconcile
+                if self.generation(self.objects.get(name)) != self.generation(manifest):
+                    self.changed.add(name)
+
+                self.objects[name] = manifest
+
+            self.condition.notify_all()
+
+    def wait_for_changes(
+        self,
+        timeout: float,
+        debounce: float
+    ) -> set:
+
+        deadline = time.monotonic() + timeout
+
+        with self.condition:
+
+            # Block until something changes or the timeout passes
+            while not self.changed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return set()
+                self.condition.wait(timeout=remaining)
+
+            # Let a burst of events settle so it is handled as one batch, as long as
+            # events keep arriving within the debounce window (up to ten windows)
+            settle_deadline = time.monotonic() + (debounce * 10)
+            while time.monotonic() < settle_deadline:
+                seen = len(self.changed)
+                self.condition.wait(timeout=debounce)
+                if len(self.changed) == seen:
+                    break
+
+            changed = self.changed
+            self.changed = set()
+
+        return changed
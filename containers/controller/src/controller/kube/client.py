@@ -0,0 +1,11 @@
+import functools
+
+import kubernetes as k8s
+
+
+@functools.lru_cache(maxsize=None)
+def kube_api_client() -> k8s.client.ApiClient:
+
+    # One client for the life of the process so its connection pool is reused
+    # by every list, watch and status patch
+    return k8s.client.ApiClient()
@@ -1,7 +1,10 @@
+import json
 import logging
 
 import kubernetes as k8s
 
+from .client import kube_api_client
+
 
 def kube_object_name(manifest: dict) -> str:
     metadata = manifest["metadata"]
@@ -11,24 +14,109 @@ def kube_object_name(manifest: dict) -> str:
     )
 
 
-def kube_iter_objects(
+def kube_project_object(manifest: dict) -> dict:
+
+    # Keep only the fields the sync reads, dropping managedFields, annotations and
+    # anything else the api server returns
+    metadata = manifest["metadata"]
+    return dict(
+        metadata=dict(
+            name=metadata["name"],
+            namespace=metadata["namespace"],
+            generation=metadata.get("generation"),
+            resourceVersion=metadata.get("resourceVersion")
+        ),
+        spec=manifest.get("spec"),
+        status=manifest.get("status")
+    )
+
+
+def kube_iter_pages(
     group: str,
     version: str,
     namespace: str,
     plural: str,
+    label_selector: str = None,
+    limit: int = 500
 ):
-    with k8s.client.ApiClient() as api:
-        crds = k8s.client.api.CustomObjectsApi(api)
+    crds = k8s.client.api.CustomObjectsApi(kube_api_client())
+
+    kwargs = dict(
+        group=group,
+        version=version,
+        plural=plural,
+        limit=limit,
+        _preload_content=False
+    )
 
-        # List all current manifests
-        manifests = crds.list_namespaced_custom_object(
-            group=group,
-            version=version,
-            namespace=namespace,
-            plural=plural,
-        )
+    if label_selector:
+        kwargs["label_selector"] = label_selector
 
-    yield from manifests["items"]
+    # Page through the manifests, parsing the raw json so each page is decoded once
+    # and projected before the next is fetched
+    _continue = None
+    while True:
+
+        # Without a namespace the manifests of every namespace are listed
+        if namespace is None:
+            response = crds.list_cluster_custom_object(_continue=_continue, **kwargs)
+        else:
+            response = crds.list_namespaced_custom_object(namespace=namespace, _continue=_continue, **kwargs)
+
+        page = json.loads(response.data)
+        page["items"] = list(map(kube_project_object, page["items"]))
+
+        yield page
+
+        _continue = page["metadata"].get("continue")
+        if not _continue:
+            return
+
+
+def kube_list_objects(
+    group: str,
+    version: str,
+    namespace: str,
+    plural: str,
+    label_selector: str = None,
+    limit: int = 500
+) -> dict:
+
+    items = list()
+    for page in kube_iter_pages(
+        group=group,
+        version=version,
+        namespace=namespace,
+        plural=plural,
+        label_selector=label_selector,
+        limit=limit
+    ):
+        items.extend(page["items"])
+
+    # Every page of a paginated list is served from the same snapshot
+    return dict(
+        items=items,
+        metadata=dict(resourceVersion=page["metadata"]["resourceVersion"])
+    )
+
+
+def kube_iter_objects(
+    group: str,
+    version: str,
+    namespace: str,
+    plural: str,
+    label_selector: str = None,
+    limit: int = 500
+):
+    for page in kube_iter_pages(
+        group=group,
+        version=version,
+        namespace=namespace,
+        plural=plural,
+        label_selector=label_selector,
+        limit=limit
+    ):
+        yield from page["items"]
 
 
 def kube_gather_objects(
@@ -36,6 +124,8 @@ def kube_gather_objects(
     version: str,
     namespace: str,
     plural: str,
+    label_selector: str = None,
+    limit: int = 500
 ) -> dict:
 
     manifests = dict()
@@ -44,7 +134,9 @@ def kube_gather_objects(
         group=group,
         version=version,
         namespace=namespace,
-        plural=plural
+        plural=plural,
+        label_selector=label_selector,
+        limit=limit
     ):
         name = kube_object_name(manifest)
 
@@ -0,0 +1,149 @@
+import datetime
+import logging
+import threading
+import time
+import typing
+
+from .leases import kube_delete_lease, kube_hold_lease, kube_lease_expired, kube_list_leases
+
+
+class KubeLeaseMembers:
+
+    namespace: str
+    name: str
+    identity: str
+    lease_duration: int
+    renew_interval: float
+    members: list
+    leader: bool
+    renewed_at: float
+    callbacks: list
+    lock: threading.Lock
+    stopped: threading.Event
+    thread: threading.Thread
+
+    def __init__(
+        self,
+        namespace: str,
+        name: str,
+        identity: str,
+        lease_duration: int = 30,
+        renew_interval: float = 10.0
+    ):
+
+        self.namespace = namespace
+        self.name = name
+        self.identity = identity
+        self.lease_duration = lease_duration
+        self.renew_interval = renew_interval
+
+        # Live replicas sorted by identity, and whether this replica holds the leader lease
+        self.members = [identity]
+        self.leader = False
+        self.renewed_at = None
+        self.callbacks = list()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    @property
+    def label_selector(self) -> str:
+        return f"guacamole.ukserp.ac.uk/controller={self.name}"
+
+    def on_change(self, callback: typing.Callable[[list], None]):
+        self.callbacks.append(callback)
+
+    def is_leader(self) -> bool:
+        with self.lock:
+            # A leader that cannot renew must assume another replica has stolen the lease
+            return self.leader and (time.monotonic() - self.renewed_at) < self.lease_duration
+
+    def start(self):
+
+        # Join before returning so the first sync already knows its shard
+        self.renew()
+
+        self.thread = threading.Thread(target=self.renew_forever, name="kube-lease", daemon=True)
+        self.thread.start()
+
+    def renew_forever(self):
+
+        while not self.stopped.wait(self.renew_interval):
+
+            try:
+                self.renew()
+
+            except Exception as ex:
+                logging.exception("Failed to renew leases!", exc_info=ex)
+
+    def stop(self):
+
+        # Wait out a renewal in flight so it cannot write the leases back after they are deleted
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+        # Leave the replica set straight away rather than when the member lease expires
+        with self.lock:
+            leader = self.leader
+            self.leader = False
+
+        kube_delete_lease(
+            namespace=self.namespace,
+            name=f"{self.name}-member-{self.identity}",
+            identity=self.identity
+        )
+
+        if leader:
+            kube_delete_lease(namespace=self.namespace, name=f"{self.name}-leader", identity=self.identity)
+
+        logging.info(f"Left controller replicas as {self.identity=}")
+
+    def renew(self):
+
+        # Leases are only trusted for their duration from before they were written
+        renewed_at = time.monotonic()
+
+        # Every replica holds a member lease of its own, its shard of the manifests
+        # is decided by the set of member leases that are still being renewed
+        kube_hold_lease(
+            namespace=self.namespace,
+            name=f"{self.name}-member-{self.identity}",
+            identity=self.identity,
+            lease_duration=self.lease_duration,
+            labels={"guacamole.ukserp.ac.uk/controller": self.name}
+        )
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        members = sorted(
+            lease.spec.holder_identity
+            for lease in kube_list_leases(namespace=self.namespace, label_selector=self.label_selector)
+            if lease.spec.holder_identity and not kube_lease_expired(lease, now)
+        )
+
+        if self.identity not in members:
+            members = sorted(members + [self.identity])
+
+        # Only the holder of the leader lease runs the global culling pass
+        leader = kube_hold_lease(
+            namespace=self.namespace,
+            name=f"{self.name}-leader",
+            identity=self.identity,
+            lease_duration=self.lease_duration,
+            steal=True
+        )
+
+        with self.lock:
+            changed = (members != self.members)
+
+            if leader != self.leader:
+                logging.info(f"Leader lease {'acquired' if leader else 'lost'} by {self.identity=}")
+
+            self.members = members
+            self.leader = leader
+            self.renewed_at = renewed_at
+
+        if changed:
+            logging.info(f"Controller replicas changed {members=}")
+            for callback in self.callbacks:
+                callback(members)
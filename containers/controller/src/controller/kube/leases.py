@@ -0,0 +1,109 @@
+import datetime
+import logging
+
+import kubernetes as k8s
+
+from .client import kube_api_client
+
+
+def kube_lease_expired(lease: k8s.client.V1Lease, now: datetime.datetime) -> bool:
+
+    renew_time = lease.spec.renew_time or lease.spec.acquire_time
+    if (renew_time is None) or (lease.spec.lease_duration_seconds is None):
+        return True
+
+    return (renew_time + datetime.timedelta(seconds=lease.spec.lease_duration_seconds)) < now
+
+
+def kube_get_lease(namespace: str, name: str) -> k8s.client.V1Lease:
+
+    leases = k8s.client.CoordinationV1Api(kube_api_client())
+
+    try:
+        return leases.read_namespaced_lease(name=name, namespace=namespace)
+
+    except k8s.client.exceptions.ApiException as ex:
+        if ex.status == 404:
+            return None
+        raise ex
+
+
+def kube_delete_lease(namespace: str, name: str, identity: str) -> bool:
+
+    leases = k8s.client.CoordinationV1Api(kube_api_client())
+
+    lease = kube_get_lease(namespace=namespace, name=name)
+    if (lease is None) or (lease.spec.holder_identity != identity):
+        return False
+
+    try:
+        # Preconditions keep a lease another replica has just taken over
+        leases.delete_namespaced_lease(
+            name=name,
+            namespace=namespace,
+            body=k8s.client.V1DeleteOptions(preconditions=k8s.client.V1Preconditions(
+                resource_version=lease.metadata.resource_version
+            ))
+        )
+        return True
+
+    except k8s.client.exceptions.ApiException as ex:
+        if ex.status in (404, 409):
+            return False
+        raise ex
+
+
+def kube_list_leases(namespace: str, label_selector: str) -> list:
+
+    leases = k8s.client.CoordinationV1Api(kube_api_client())
+    return leases.list_namespaced_lease(namespace=namespace, label_selector=label_selector).items
+
+
+def kube_hold_lease(
+    namespace: str,
+    name: str,
+    identity: str,
+    lease_duration: int,
+    labels: dict = None,
+    steal: bool = False
+) -> bool:
+
+    leases = k8s.client.CoordinationV1Api(kube_api_client())
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    lease = kube_get_lease(namespace=namespace, name=name)
+
+    try:
+        if lease is None:
+            leases.create_namespaced_lease(namespace=namespace, body=k8s.client.V1Lease(
+                metadata=k8s.client.V1ObjectMeta(name=name, labels=labels),
+                spec=k8s.client.V1LeaseSpec(
+                    holder_identity=identity,
+                    lease_duration_seconds=lease_duration,
+                    acquire_time=now,
+                    renew_time=now
+                )
+            ))
+            return True
+
+        # Another holder keeps the lease until it stops renewing it
+        if (lease.spec.holder_identity != identity) and not (steal and kube_lease_expired(lease, now)):
+            return False
+
+        if lease.spec.holder_identity != identity:
+            logging.info(f"Acquiring expired lease {namespace=} {name=} from {lease.spec.holder_identity=}")
+            lease.spec.holder_identity = identity
+            lease.spec.acquire_time = now
+            lease.spec.lease_transitions = (lease.spec.lease_transitions or 0) + 1
+
+        lease.spec.lease_duration_seconds = lease_duration
+        lease.spec.renew_time = now
+
+        # The read resource version makes the write fail if another replica got there first
+        leases.replace_namespaced_lease(name=name, namespace=namespace, body=lease)
+        return True
+
+    except k8s.client.exceptions.ApiException as ex:
+        if ex.status == 409:
+            return False
+        raise ex
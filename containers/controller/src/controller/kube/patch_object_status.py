@@ -0,0 +1,28 @@
+import logging
+
+import kubernetes as k8s
+
+from .client import kube_api_client
+
+
+def kube_patch_object_status(
+    group: str,
+    version: str,
+    namespace: str,
+    plural: str,
+    name: str,
+    status: dict
+):
+
+    logging.debug(f"Patching status {namespace=} {name=} {status=}")
+    crds = k8s.client.api.CustomObjectsApi(kube_api_client())
+
+    # Merge the given fields into the status subresource
+    crds.patch_namespaced_custom_object_status(
+        group=group,
+        version=version,
+        namespace=namespace,
+        plural=plural,
+        name=name,
+        body=dict(status=status)
+    )
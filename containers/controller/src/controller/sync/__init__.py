@@ -1 +1,3 @@
-from .sync import sync
+from .reconciler import Reconciler
+from .async_sync import async_sync
+from .watch_manifests import watch_manifests
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+
+from .async_sync_connections import async_sync_connections
+from .async_sync_users import async_sync_users
+from .get_users_by_manifest import get_users_by_manifest
+from .get_manifests import get_manifests
+from .manifest_statuses import ManifestStatuses
+
+from ..api.aio import AsyncAPI
+from ..directory import LDAP
+
+
+async def async_sync(
+    ldap: LDAP,
+    api: AsyncAPI,
+    kube_namespace: str,
+    manifests: dict = None
+):
+
+    api.clear_stats()
+
+    # Start a new cycle of group expansions, shared by every manifest in it
+    ldap.expire_cache()
+
+    # The kubernetes and ldap clients are blocking, so they run off the event loop
+
+    # Lookup GuacamoleConnection manifests from kubes, unless a cache has provided them
+    if manifests is None:
+        manifests = await asyncio.to_thread(get_manifests, namespace=kube_namespace)
+
+    # Search LDAP for each GuacamoleConnection manifest to get its expected users
+    expected_users_by_manifest = await asyncio.to_thread(get_users_by_manifest, ldap=ldap, manifests=manifests)
+
+    # For all the unique users create or update them using the Guacamole REST api
+    await async_sync_users(
+        api=api,
+        expected_users_by_manifest=expected_users_by_manifest
+    )
+
+    # For all the connections create or update them using the Guacamole REST api
+    statuses = ManifestStatuses()
+    await async_sync_connections(
+        api=api,
+        manifests=manifests,
+        expected_users_by_manifest=expected_users_by_manifest,
+        statuses=statuses
+    )
+
+    # Write the status of every manifest that was applied this cycle, the kubernetes
+    # client is blocking so it runs off the event loop
+    await asyncio.to_thread(statuses.flush)
+
+    logging.info(f"Sync complete {dict(api.stats)}")
+
+    if api.errors:
+        logging.error(f"Sync completed with {len(api.errors)} failed api calls")
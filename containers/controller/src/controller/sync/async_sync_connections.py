@@ -0,0 +1,79 @@
+import logging
+import time
+
+from .diff_user_connections import diff_user_connections
+from .manifest_statuses import ManifestStatuses
+from .plan_connection import count_sync_failures, plan_connection, plan_connection_culls, plan_connection_status
+from ..api.aio import AsyncAPI
+
+
+async def async_sync_connections(
+    api: AsyncAPI,
+    manifests: dict,
+    expected_users_by_manifest: dict,
+    statuses: ManifestStatuses
+):
+    logging.info("Syncing connections")
+
+    observed_connections = await api.list_connections()
+
+    # Snapshot the users with access to each connection once for the whole cycle
+    observed_users_by_connection = await api.list_users_by_connection()
+
+    async def sync_connection(manifest_name: str):
+
+        manifest = manifests[manifest_name]
+
+        start = time.monotonic()
+
+        plan = plan_connection(
+            manifest=manifest,
+            expected_usernames=set(expected_users_by_manifest.get(manifest_name, dict())),
+            connections_by_name=api.connections_by_name,
+            observed_users_by_connection=observed_users_by_connection,
+            service_username=api.username
+        )
+
+        if plan["current"]:
+            api.count("connections_skipped")
+            return plan["connection"]["conn_id"]
+
+        logging.info(f"Syncing connection {plan['connection']['name']=}")
+
+        conn_id = await api.create_or_update_connection(**plan["connection"])
+
+        statuses.update(
+            manifest=manifest,
+            status=plan_connection_status(manifest=manifest, plan=plan, conn_id=conn_id, start=start)
+        )
+
+        return conn_id
+
+    # Add connections via api, each manifest is independent so they run concurrently
+    manifest_names = list(manifests)
+    conn_ids = dict(zip(manifest_names, await api.run_concurrently(sync_connection, manifest_names)))
+
+    grants_by_user, revokes_by_user = diff_user_connections(
+        conn_ids_by_manifest=conn_ids,
+        expected_users_by_manifest=expected_users_by_manifest,
+        observed_users_by_connection=observed_users_by_connection,
+        service_username=api.username
+    )
+
+    # Grant and revoke user connections via api, users are independent so they run concurrently
+    permission_failures = await api.run_concurrently(
+        lambda username: api.update_user_connections(
+            username=username,
+            grant_conn_ids=grants_by_user[username],
+            revoke_conn_ids=revokes_by_user[username]
+        ),
+        sorted(set(grants_by_user) | set(revokes_by_user))
+    )
+
+    # Cull connections
+    await api.run_concurrently(
+        lambda conn_id: api.delete_connection(conn_id=conn_id),
+        plan_connection_culls(conn_ids=conn_ids, observed_connections=observed_connections)
+    )
+
+    return count_sync_failures(conn_ids=conn_ids, permission_failures=permission_failures)
@@ -0,0 +1,38 @@
+import logging
+
+from .plan_users import plan_users
+from ..api.aio import AsyncAPI
+
+
+async def async_sync_users(
+    api: AsyncAPI,
+    expected_users_by_manifest: dict
+):
+
+    logging.info("Syncing users")
+
+    plan = plan_users(
+        expected_users_by_manifest=expected_users_by_manifest,
+        observed_users=await api.list_users(),
+        service_username=api.username
+    )
+
+    # Add, update and cull users in batches via api, failed operations are logged
+    # and returned so the caller can retry them
+    failures = await api.create_users(
+        users=plan["create"],
+        organization=plan["organization"],
+        role=plan["role"]
+    )
+
+    failures += await api.update_users(
+        users=plan["update"],
+        organization=plan["organization"],
+        role=plan["role"]
+    )
+
+    api.count("users_unchanged", len(plan["unchanged"]))
+
+    failures += await api.delete_users(usernames=[user["username"] for user in plan["delete"]])
+
+    return failures
@@ -0,0 +1,31 @@
+from collections import defaultdict
+
+
+def diff_user_connections(
+    conn_ids_by_manifest: dict,
+    expected_users_by_manifest: dict,
+    observed_users_by_connection: dict,
+    service_username: str
+):
+
+    # Permission changes gathered across every manifest so they can be sent as one
+    # request per user rather than one per user and connection
+    grants_by_user = defaultdict(set)
+    revokes_by_user = defaultdict(set)
+
+    for manifest_name, conn_id in conn_ids_by_manifest.items():
+
+        if conn_id is None:
+            continue
+
+        observed_connection_users = observed_users_by_connection.get(str(conn_id), set())
+
+        for user in expected_users_by_manifest[manifest_name].values():
+            if user["username"] not in observed_connection_users:
+                grants_by_user[user["username"]].add(conn_id)
+
+        for observed_username in observed_connection_users:
+            if (observed_username not in expected_users_by_manifest[manifest_name]) and (observed_username != service_username):
+                revokes_by_user[observed_username].add(conn_id)
+
+    return grants_by_user, revokes_by_user
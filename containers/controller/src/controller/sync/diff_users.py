@@ -0,0 +1,54 @@
+import logging
+
+from ..api.users.diff import build_user_attributes, user_needs_update
+
+
+def diff_users(
+    expected_users: dict,
+    observed_users: dict,
+    organization: str,
+    role: str,
+    service_username: str
+):
+
+    observed_users = {
+        user["username"]: user
+        for user in observed_users.values()
+    }
+
+    users_to_create = list()
+    users_to_update = list()
+    users_unchanged = list()
+
+    for username, user in expected_users.items():
+
+        if username not in observed_users:
+            users_to_create.append(user)
+            continue
+
+        needs_update = user_needs_update(
+            observed_user=observed_users[username],
+            attributes=build_user_attributes(
+                fullname=user["fullname"],
+                email=user["email"],
+                organization=organization,
+                role=role
+            )
+        )
+
+        if needs_update:
+            users_to_update.append(user)
+        else:
+            users_unchanged.append(user)
+
+    users_to_delete = [
+        user for username, user in observed_users.items()
+        if (username not in expected_users) and (username != service_username)
+    ]
+
+    logging.info(
+        f"Found {len(users_to_create)} users to create, {len(users_to_update)} to update, "
+        f"{len(users_unchanged)} unchanged and {len(users_to_delete)} to delete"
+    )
+
+    return users_to_create, users_to_update, users_unchanged, users_to_delete
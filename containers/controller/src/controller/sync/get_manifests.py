@@ -3,14 +3,16 @@ import logging
 from ..kube import kube_gather_objects
 
 
-def get_manifests(namespace: str):
+def get_manifests(namespace: str, label_selector: str = None, limit: int = 500):
 
     logging.info("Searching for kubes manifests")
     manifests = kube_gather_objects(
         group="guacamole.ukserp.ac.uk",
         version="v1",
         plural="guacamoleconnections",
-        namespace=namespace
+        namespace=namespace,
+        label_selector=label_selector,
+        limit=limit
     )
     logging.info(f"Found {len(manifests)} manifests")
     return manifests
@@ -15,17 +15,12 @@ def get_users_by_manifest(
             email=record["attributes"][ldap.email_attribute]
         )
 
-    users_by_manifest = dict()
-    for name, manifest in manifests.items():
-
-        if not manifest["spec"]["ldap"]["enabled"]:
-            logging.info(f"{name=} Skipping user membership lookup for manifest")
-            continue
+    def lookup(name):
 
-        group_search_filter = manifest["spec"]["ldap"]["groupFilter"]
+        group_search_filter = manifests[name]["spec"]["ldap"]["groupFilter"]
         logging.info(f"Searching user membership for manifest {name} {group_search_filter=}")
 
-        users_by_manifest[name] = {
+        users = {
             user["username"]: user for user in map(record_fn, ldap.iter_group_members(
                 group_search_filter=group_search_filter,
                 attributes=[
@@ -36,6 +31,17 @@ def get_users_by_manifest(
             ))
         }
 
-        logging.info(f"Found {len(users_by_manifest[name])} users")
+        logging.info(f"Found {len(users)} users for manifest {name}")
+        return users
+
+    names = list()
+    for name, manifest in manifests.items():
+
+        if not manifest["spec"]["ldap"]["enabled"]:
+            logging.info(f"{name=} Skipping user membership lookup for manifest")
+            continue
+
+        names.append(name)
 
-    return users_by_manifest
+    # Manifests are expanded concurrently, each over its own pooled connection
+    return dict(zip(names, ldap.executor.map(lookup, names)))
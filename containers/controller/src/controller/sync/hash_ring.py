@@ -0,0 +1,36 @@
+import bisect
+import hashlib
+
+
+class HashRing:
+
+    replicas: int
+    points: list
+    owners: list
+
+    def __init__(self, members: list, replicas: int = 64):
+
+        self.replicas = replicas
+
+        # Each member is placed at many points on the ring so keys spread evenly, and
+        # only the keys next to a joining or leaving member's points change owner
+        ring = sorted(
+            (self.hash(f"{member}#{index}"), member)
+            for member in members
+            for index in range(replicas)
+        )
+
+        self.points = [point for point, _ in ring]
+        self.owners = [member for _, member in ring]
+
+    @staticmethod
+    def hash(key: str) -> int:
+        return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+    def owner(self, key: str) -> str:
+
+        if not self.points:
+            return None
+
+        index = bisect.bisect(self.points, self.hash(key)) % len(self.points)
+        return self.owners[index]
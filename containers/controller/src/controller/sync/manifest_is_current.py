@@ -0,0 +1,19 @@
+def manifest_is_current(
+    manifest: dict,
+    membership: str,
+    observed_conn_id: str,
+    observed_usernames: set,
+    expected_usernames: set
+) -> bool:
+
+    status = manifest.get("status") or dict()
+
+    # The spec and membership were last applied as they are now, and the connection and its
+    # permissions observed in Guacamole still match, so there is nothing to write
+    return all([
+        status.get("observedGeneration") == manifest["metadata"].get("generation"),
+        status.get("membershipHash") == membership,
+        status.get("connectionId") is not None,
+        str(status.get("connectionId")) == str(observed_conn_id),
+        observed_usernames == expected_usernames
+    ])
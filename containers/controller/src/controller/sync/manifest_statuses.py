@@ -0,0 +1,59 @@
+import logging
+import threading
+
+from .set_manifest_status import set_manifest_status
+from ..kube import kube_object_name
+
+
+class ManifestStatuses:
+
+    pending: dict
+    lock: threading.Lock
+
+    def __init__(self):
+
+        # Manifest name -> (manifest, status fields) waiting to be written
+        self.pending = dict()
+        self.lock = threading.Lock()
+
+    def update(
+        self,
+        manifest: dict,
+        status: dict
+    ):
+
+        name = kube_object_name(manifest)
+
+        # Apply to the local copy straight away so later syncs see it, and coalesce
+        # every update made to the manifest until the next flush into one write
+        with self.lock:
+            manifest["status"] = {**(manifest.get("status") or dict()), **status}
+
+            _, pending_status = self.pending.get(name, (None, dict()))
+            self.pending[name] = (manifest, {**pending_status, **status})
+
+    def flush(self):
+
+        with self.lock:
+            pending = self.pending
+            self.pending = dict()
+
+        if not pending:
+            return
+
+        logging.info(f"Writing {len(pending)} manifest statuses")
+
+        for name, (manifest, status) in pending.items():
+            try:
+                set_manifest_status(
+                    manifest=manifest,
+                    status=status
+                )
+
+            except Exception as ex:
+                logging.exception(f"Failed to write manifest status {name=}", exc_info=ex)
+
+                # Keep the failed write for the next flush unless a newer one replaced it
+                with self.lock:
+                    _, newer_status = self.pending.get(name, (None, dict()))
+                    self.pending[name] = (manifest, {**status, **newer_status})
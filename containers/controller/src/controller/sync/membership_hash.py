@@ -0,0 +1,10 @@
+import hashlib
+import json
+import typing
+
+
+def membership_hash(usernames: typing.Set[str]) -> str:
+
+    # Stable digest of the usernames resolved for a manifest, recorded on its status
+    # so an unchanged membership can be recognised without comparing permissions
+    return hashlib.sha256(json.dumps(sorted(usernames)).encode("utf-8")).hexdigest()
@@ -0,0 +1,95 @@
+import logging
+import time
+
+from .manifest_is_current import manifest_is_current
+from .membership_hash import membership_hash
+
+
+def plan_connection(
+    manifest: dict,
+    expected_usernames: set,
+    connections_by_name: dict,
+    observed_users_by_connection: dict,
+    service_username: str
+) -> dict:
+
+    name = manifest["metadata"]["name"]
+    namespace = manifest["metadata"]["namespace"]
+
+    conn_protocol = manifest["spec"]["protocol"]
+    conn_name = f"{namespace}/{name} - {conn_protocol}"
+
+    status_conn_id = (manifest.get("status") or dict()).get("connectionId")
+
+    membership = membership_hash(expected_usernames)
+
+    # Skip manifests whose generation and membership were already applied
+    is_current = manifest_is_current(
+        manifest=manifest,
+        membership=membership,
+        observed_conn_id=connections_by_name.get(conn_name, dict()).get("identifier"),
+        observed_usernames=observed_users_by_connection.get(str(status_conn_id), set()) - {service_username},
+        expected_usernames=expected_usernames
+    )
+
+    return dict(
+        current=is_current,
+        membership=membership,
+        connection=dict(
+            parent="ROOT",
+            name=conn_name,
+            protocol=conn_protocol,
+            hostname=manifest["spec"]["hostname"],
+            port=manifest["spec"]["port"],
+            conn_id=status_conn_id
+        )
+    )
+
+
+def plan_connection_status(
+    manifest: dict,
+    plan: dict,
+    conn_id: str,
+    start: float
+) -> dict:
+
+    # Record what was applied so the next sync can skip the manifest, and the resolved
+    # identifier so lookups after a restart can skip the listing
+    return dict(
+        observedGeneration=manifest["metadata"].get("generation"),
+        connectionId=conn_id,
+        membershipHash=plan["membership"],
+        lastSyncTime=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        syncDuration=round(time.monotonic() - start, 3)
+    )
+
+
+def plan_connection_culls(
+    conn_ids: dict,
+    observed_connections: dict
+) -> list:
+
+    # A connection that failed to sync would look unexpected, so skip culling until it succeeds
+    if any((conn_id is None) for conn_id in conn_ids.values()):
+        logging.warning("Skipping culling connections as some connections failed to sync")
+        return list()
+
+    expected_connections = set(conn_ids.values())
+
+    return [
+        observed_connection["identifier"]
+        for observed_connection in observed_connections.values()
+        if observed_connection["identifier"] not in expected_connections
+    ]
+
+
+def count_sync_failures(
+    conn_ids: dict,
+    permission_failures: list
+) -> int:
+
+    # Count the connections and users whose changes did not all apply, a user whose
+    # call raised returns None rather than its list of failures
+    failed = sum((conn_id is None) for conn_id in conn_ids.values())
+    failed += sum(((failures is None) or bool(failures)) for failures in permission_failures)
+    return failed
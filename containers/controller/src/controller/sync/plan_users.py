@@ -0,0 +1,31 @@
+from .diff_users import diff_users
+from .get_unique_users import get_unique_users
+
+
+def plan_users(
+    expected_users_by_manifest: dict,
+    observed_users: dict,
+    service_username: str
+) -> dict:
+
+    organization = f"MANAGED-BY: {service_username}"
+    role = "MANAGED USER"
+
+    # Diff against the attributes already present in the single list response
+    # rather than fetching each user individually
+    users_to_create, users_to_update, users_unchanged, users_to_delete = diff_users(
+        expected_users=get_unique_users(users_by_manifest=expected_users_by_manifest),
+        observed_users=observed_users,
+        organization=organization,
+        role=role,
+        service_username=service_username
+    )
+
+    return dict(
+        organization=organization,
+        role=role,
+        create=users_to_create,
+        update=users_to_update,
+        unchanged=users_unchanged,
+        delete=users_to_delete
+    )
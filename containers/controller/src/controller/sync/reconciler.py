@@ -0,0 +1,234 @@
+import logging
+import threading
+import time
+import typing
+
+from .get_users_by_manifest import get_users_by_manifest
+from .hash_ring import HashRing
+from .manifest_statuses import ManifestStatuses
+from .sync_connections import sync_connections
+from .sync_users import sync_users
+from .work_queue import WorkQueue
+
+from ..api import API
+from ..directory import LDAP
+from ..kube import KubeLeaseMembers, KubeObjectCache
+
+
+class Reconciler:
+
+    ldap: LDAP
+    api: API
+    cache: KubeObjectCache
+    members: KubeLeaseMembers
+    ring: HashRing
+    workers: int
+    status_interval: float
+    queue: WorkQueue
+    statuses: ManifestStatuses
+    unpermitted_users: set
+
+    def __init__(
+        self,
+        ldap: LDAP,
+        api: API,
+        cache: KubeObjectCache,
+        members: KubeLeaseMembers = None,
+        workers: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 300.0,
+        status_interval: float = 5.0
+    ):
+
+        self.ldap = ldap
+        self.api = api
+        self.cache = cache
+        self.workers = workers
+        self.status_interval = status_interval
+        self.queue = WorkQueue(base_delay=base_delay, max_delay=max_delay)
+
+        # Status updates from every worker, written together every status_interval seconds
+        self.statuses = ManifestStatuses()
+
+        # Replicas coordinating through leases each reconcile the manifests hashed to them,
+        # a single replica without leases reconciles every manifest
+        self.members = members
+        self.ring = HashRing(members=members.members if members else [None])
+
+        if members is not None:
+            members.on_change(self.rebalance)
+
+        # Users seen without access to any connection by the last culling pass
+        self.unpermitted_users = set()
+
+    def start(self):
+
+        for index in range(self.workers):
+            threading.Thread(target=self.work_forever, name=f"reconcile-{index}", daemon=True).start()
+
+        threading.Thread(target=self.flush_forever, name="reconcile-status", daemon=True).start()
+
+    def owns(self, name: str) -> bool:
+        return self.ring.owner(name) == (self.members.identity if self.members else None)
+
+    def is_leader(self) -> bool:
+        return (self.members is None) or self.members.is_leader()
+
+    def rebalance(self, members: list):
+
+        self.ring = HashRing(members=members)
+
+        # The manifests moved to this replica were reconciled by their previous owner since
+        # this replica last listed, refresh the indexes so their connections and grants are found
+        try:
+            self.api.list_users_by_connection()
+            self.api.list_connections()
+
+        except Exception as ex:
+            logging.exception("Failed to refresh api indexes on rebalance!", exc_info=ex)
+
+        # Pick up the manifests moved to this replica, ones moved away are dropped
+        # by the workers as they come off the queue
+        self.enqueue(self.cache.snapshot(), priority=False)
+
+    def enqueue(self, names: typing.Iterable[str], priority: bool = True):
+
+        for name in names:
+            if self.owns(name):
+                self.queue.add(name, priority=priority)
+
+    def resync(self):
+
+        logging.info(f"Reconcile complete {dict(self.api.stats)}")
+
+        if self.api.errors:
+            logging.error(f"Reconcile completed with {len(self.api.errors)} failed api calls")
+
+        self.api.clear_stats()
+
+        # Start a new cycle of group expansions, shared by every manifest reconciled in it
+        self.ldap.expire_cache()
+
+        # Refresh the user, permission and connection indexes on every replica so each
+        # manifest's reconcile also reverts drift made outside the controller, and finds
+        # connections created by whichever replica reconciled the manifest before it.
+        # Listing before taking the snapshot guarantees anything created by a reconcile
+        # belongs to a manifest already in the snapshot
+        self.api.list_users_by_connection()
+        observed_connections = self.api.list_connections()
+
+        # Culling sees every replica's users and connections, so only the leader runs it
+        if self.is_leader():
+            self.cull(observed_connections)
+
+        # Every manifest is reconciled again behind any changed manifests
+        self.enqueue(self.cache.snapshot(), priority=False)
+
+    def cull(self, observed_connections: dict):
+
+        manifests = self.cache.snapshot()
+
+        # Connections are named after their manifest, so ones without a manifest can be
+        # found without waiting for every manifest to be reconciled
+        self.api.run_concurrently(
+            lambda conn_id: self.api.delete_connection(conn_id=conn_id),
+            [
+                connection["identifier"]
+                for connection in observed_connections.values()
+                if connection["name"].split(" - ", 1)[0] not in manifests
+            ]
+        )
+
+        # Reconciles revoke users from connections they no longer belong to, so a user with
+        # no access left is expected by no manifest, whichever replica reconciled it
+        with self.api.lock:
+            permitted_users = set().union(*self.api.users_by_connection.values())
+            unpermitted_users = {
+                username for username in self.api.users_by_name
+                if (username not in permitted_users) and (username not in self.api.unindexed_users)
+                and (username != self.api.username)
+            }
+
+        # A user is only culled once it has had no access for two passes in a row, giving
+        # a reconcile that has just created it time to grant its permissions
+        usernames = unpermitted_users & self.unpermitted_users
+        self.unpermitted_users = unpermitted_users - usernames
+
+        self.api.delete_users(usernames=sorted(usernames))
+
+    def flush_forever(self):
+
+        while True:
+            time.sleep(self.status_interval)
+            self.statuses.flush()
+
+    def work_forever(self):
+
+        while True:
+            name = self.queue.get()
+
+            try:
+                # The manifest may have moved to another replica since it was queued
+                if self.owns(name):
+                    self.reconcile(name)
+                self.queue.forget(name)
+
+            except Exception as ex:
+                delay = self.queue.retry(name)
+                logging.exception(f"Failed to reconcile {name=}, retrying in {delay}s", exc_info=ex)
+
+            finally:
+                self.queue.done(name)
+
+    def reconcile(self, name: str):
+
+        manifest = self.cache.snapshot().get(name)
+
+        if manifest is None:
+            self.reconcile_deleted(name)
+            return
+
+        logging.info(f"Reconciling manifest {name=}")
+
+        expected_users_by_manifest = get_users_by_manifest(ldap=self.ldap, manifests={name: manifest})
+        expected_users_by_manifest.setdefault(name, dict())
+
+        # Users who may still have access through other manifests are only culled by the resync
+        failures = len(sync_users(
+            api=self.api,
+            expected_users_by_manifest=expected_users_by_manifest,
+            cull=False
+        ))
+
+        failures += sync_connections(
+            api=self.api,
+            manifests={name: manifest},
+            expected_users_by_manifest=expected_users_by_manifest,
+            statuses=self.statuses,
+            cull=False
+        )
+
+        # Remove the connection left behind when the manifest's protocol changes
+        conn_name = f"{name} - {manifest['spec']['protocol']}"
+        self.delete_connections(name, keep=conn_name)
+
+        if failures:
+            raise RuntimeError(("Failed to reconcile manifest!", name, failures))
+
+    def reconcile_deleted(self, name: str):
+
+        logging.info(f"Reconciling deleted manifest {name=}")
+
+        self.delete_connections(name)
+
+    def delete_connections(self, name: str, keep: str = None):
+
+        if self.api.connections_by_name is None:
+            self.api.list_connections()
+
+        with self.api.lock:
+            connections = list(self.api.connections_by_name.items())
+
+        for conn_name, connection in connections:
+            if (conn_name.split(" - ", 1)[0] == name) and (conn_name != keep):
+                self.api.delete_connection(conn_id=connection["identifier"])
@@ -0,0 +1,22 @@
+import logging
+
+from ..kube import kube_patch_object_status
+
+
+def set_manifest_status(
+    manifest: dict,
+    status: dict
+):
+
+    name = manifest["metadata"]["name"]
+    namespace = manifest["metadata"]["namespace"]
+
+    logging.info(f"Updating manifest status {namespace}/{name} {status=}")
+    kube_patch_object_status(
+        group="guacamole.ukserp.ac.uk",
+        version="v1",
+        plural="guacamoleconnections",
+        namespace=namespace,
+        name=name,
+        status=status
+    )
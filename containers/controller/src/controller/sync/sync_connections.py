@@ -1,58 +1,98 @@
 import logging
+import time
 
+from .diff_user_connections import diff_user_connections
+from .manifest_statuses import ManifestStatuses
+from .plan_connection import count_sync_failures, plan_connection, plan_connection_culls, plan_connection_status
 from ..api import API
 
 
 def sync_connections(
     api: API,
     manifests: dict,
-    expected_users_by_manifest: dict
+    expected_users_by_manifest: dict,
+    statuses: ManifestStatuses,
+    cull: bool = True
 ):
     logging.info("Syncing connections")
 
-    observed_connections = api.list_connections()
-    expected_connections = set()
+    if cull or (api.connections_by_name is None) or (api.users_by_connection is None):
 
-    # Add connections via api
-    for manifest_name, manifest in manifests.items():
+        observed_connections = api.list_connections()
 
-        name = manifest["metadata"]["name"]
-        namespace = manifest["metadata"]["namespace"]
+        # Snapshot the users with access to each connection once for the whole cycle
+        observed_users_by_connection = api.list_users_by_connection()
 
-        conn_protocol = manifest["spec"]["protocol"]
-        conn_name = f"{namespace}/{name} - {conn_protocol}"
+    else:
 
-        logging.info(f"Syncing connection {conn_name=}")
+        # Targeted syncs of a few manifests reuse the indexes from the last full sync,
+        # which the controller's own writes have kept current since
+        with api.lock:
+            observed_users_by_connection = {
+                conn_id: set(usernames)
+                for conn_id, usernames in api.users_by_connection.items()
+            }
 
-        conn_id = api.create_or_update_connection(
-            parent="ROOT",
-            name=conn_name,
-            protocol=conn_protocol,
-            hostname=manifest["spec"]["hostname"],
-            port=manifest["spec"]["port"]
+    def sync_connection(manifest_name: str):
+
+        manifest = manifests[manifest_name]
+
+        start = time.monotonic()
+
+        with api.lock:
+            plan = plan_connection(
+                manifest=manifest,
+                expected_usernames=set(expected_users_by_manifest.get(manifest_name, dict())),
+                connections_by_name=api.connections_by_name,
+                observed_users_by_connection=observed_users_by_connection,
+                service_username=api.username
+            )
+
+        if plan["current"]:
+            api.count("connections_skipped")
+            return plan["connection"]["conn_id"]
+
+        logging.info(f"Syncing connection {plan['connection']['name']=}")
+
+        conn_id = api.create_or_update_connection(**plan["connection"])
+
+        statuses.update(
+            manifest=manifest,
+            status=plan_connection_status(manifest=manifest, plan=plan, conn_id=conn_id, start=start)
         )
 
-        expected_connections.add(conn_id)
+        return conn_id
 
-        logging.info(f"Syncing connection users {conn_name=}")
+    # Add connections via api, each manifest is independent so they run concurrently
+    manifest_names = list(manifests)
+    conn_ids = dict(zip(manifest_names, api.run_concurrently(sync_connection, manifest_names)))
 
-        observed_connection_users = api.list_connection_users(conn_id=conn_id)
+    grants_by_user, revokes_by_user = diff_user_connections(
+        conn_ids_by_manifest=conn_ids,
+        expected_users_by_manifest=expected_users_by_manifest,
+        observed_users_by_connection=observed_users_by_connection,
+        service_username=api.username
+    )
 
-        for user in expected_users_by_manifest[manifest_name].values():
-            if user["username"] not in observed_connection_users:
-                api.create_user_connection(
-                    username=user["username"],
-                    conn_id=conn_id
-                )
+    # Grant and revoke user connections via api, users are independent so they run concurrently
+    permission_failures = api.run_concurrently(
+        lambda username: api.update_user_connections(
+            username=username,
+            grant_conn_ids=grants_by_user[username],
+            revoke_conn_ids=revokes_by_user[username]
+        ),
+        sorted(set(grants_by_user) | set(revokes_by_user))
+    )
 
-        for observed_user in observed_connection_users.values():
-            if (observed_user["username"] not in expected_users_by_manifest[manifest_name]) and (observed_user["username"] != api.username):
-                api.delete_user_connection(
-                    username=observed_user["username"],
-                    conn_id=conn_id
-                )
+    failed = count_sync_failures(conn_ids=conn_ids, permission_failures=permission_failures)
+
+    if not cull:
+        return failed
 
     # Cull connections
-    for observed_connection in observed_connections.values():
-        if observed_connection["identifier"] not in expected_connections:
-            api.delete_connection(conn_id=observed_connection["identifier"])
+    api.run_concurrently(
+        lambda conn_id: api.delete_connection(conn_id=conn_id),
+        plan_connection_culls(conn_ids=conn_ids, observed_connections=observed_connections)
+    )
+
+    return failed
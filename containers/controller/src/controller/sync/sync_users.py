@@ -1,32 +1,66 @@
 import logging
 
-from .get_unique_users import get_unique_users
+from .plan_users import plan_users
 from ..api import API
 
 
 def sync_users(
     api: API,
-    expected_users_by_manifest: dict
+    expected_users_by_manifest: dict,
+    cull: bool = True
 ):
 
     logging.info("Syncing users")
 
-    expected_users = get_unique_users(users_by_manifest=expected_users_by_manifest)
+    listed = cull or (api.users_by_name is None)
+    if listed:
+        observed_users = api.list_users()
 
-    observed_users = api.list_users()
+    else:
+        # Targeted syncs of a few manifests reuse the index from the last listing,
+        # which the controller's own writes have kept current since
+        with api.lock:
+            observed_users = dict(api.users_by_name)
 
-    # Add users via api
-    for user in expected_users.values():
+    plan = plan_users(
+        expected_users_by_manifest=expected_users_by_manifest,
+        observed_users=observed_users,
+        service_username=api.username
+    )
 
-        api.create_or_update_user(
-            username=user["username"],
-            fullname=user["fullname"],
-            email=user["email"],
-            organization=f"MANAGED-BY: {api.username}",
-            role="MANAGED USER"
+    # Add, update and cull users in batches via api, failed operations are logged
+    # and returned so the caller can retry them
+    failures = api.create_users(
+        users=plan["create"],
+        organization=plan["organization"],
+        role=plan["role"]
+    )
+
+    if failures and not listed:
+        # Another replica may have created some of these users since the index was listed,
+        # plan once more against a fresh listing so they are updated rather than added again
+        logging.info("Relisting users after rejected creates")
+        plan = plan_users(
+            expected_users_by_manifest=expected_users_by_manifest,
+            observed_users=api.list_users(),
+            service_username=api.username
+        )
+
+        failures = api.create_users(
+            users=plan["create"],
+            organization=plan["organization"],
+            role=plan["role"]
         )
 
-    # Cull users
-    for observed_user in observed_users.values():
-        if (observed_user["username"] not in expected_users) and (observed_user["username"] != api.username):
-            api.delete_user(username=observed_user["username"])
+    failures += api.update_users(
+        users=plan["update"],
+        organization=plan["organization"],
+        role=plan["role"]
+    )
+
+    api.count("users_unchanged", len(plan["unchanged"]))
+
+    if cull:
+        failures += api.delete_users(usernames=[user["username"] for user in plan["delete"]])
+
+    return failures
@@ -0,0 +1,59 @@
+from .diff_users import diff_users
+from ..api.users.diff import build_user_attributes
+
+
+def observed(username: str, fullname: str, email: str) -> dict:
+    return dict(
+        username=username,
+        attributes=build_user_attributes(
+            fullname=fullname,
+            email=email,
+            organization="MANAGED-BY: svc",
+            role="MANAGED USER"
+        )
+    )
+
+
+def test_diff_users():
+
+    expected_users = {
+        "new": dict(username="new", fullname="New", email="new@example.com"),
+        "changed": dict(username="changed", fullname="Changed", email="changed@example.com"),
+        "same": dict(username="same", fullname="Same", email="same@example.com")
+    }
+
+    observed_users = {
+        "changed": observed("changed", "Old Name", "changed@example.com"),
+        "same": observed("same", "Same", "same@example.com"),
+        "gone": observed("gone", "Gone", "gone@example.com"),
+        "svc": dict(username="svc", attributes=dict())
+    }
+
+    users_to_create, users_to_update, users_unchanged, users_to_delete = diff_users(
+        expected_users=expected_users,
+        observed_users=observed_users,
+        organization="MANAGED-BY: svc",
+        role="MANAGED USER",
+        service_username="svc"
+    )
+
+    assert [user["username"] for user in users_to_create] == ["new"]
+    assert [user["username"] for user in users_to_update] == ["changed"]
+    assert [user["username"] for user in users_unchanged] == ["same"]
+
+    # The service account is never culled
+    assert [user["username"] for user in users_to_delete] == ["gone"]
+
+
+def test_diff_users_updates_users_managed_by_another_role():
+
+    users_to_create, users_to_update, users_unchanged, users_to_delete = diff_users(
+        expected_users={"user": dict(username="user", fullname="User", email="user@example.com")},
+        observed_users={"user": observed("user", "User", "user@example.com")},
+        organization="MANAGED-BY: svc",
+        role="ANOTHER ROLE",
+        service_username="svc"
+    )
+
+    assert (users_to_create, users_unchanged, users_to_delete) == (list(), list(), list())
+    assert [user["username"] for user in users_to_update] == ["user"]
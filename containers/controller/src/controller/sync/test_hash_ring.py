@@ -0,0 +1,44 @@
+from .hash_ring import HashRing
+
+
+KEYS = [f"namespace/manifest-{index}" for index in range(2000)]
+
+
+def test_empty_ring_owns_nothing():
+    assert HashRing(list()).owner("namespace/manifest") is None
+
+
+def test_owner_is_stable_and_spread_across_members():
+
+    members = ["a", "b", "c"]
+    ring = HashRing(members)
+
+    owners = [ring.owner(key) for key in KEYS]
+    assert owners == [HashRing(list(reversed(members))).owner(key) for key in KEYS]
+
+    # Every member takes a reasonable share of the keys
+    for member in members:
+        assert owners.count(member) > len(KEYS) / 6
+
+
+def test_only_a_leaving_members_keys_move():
+
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b"])
+
+    for key in KEYS:
+        if before.owner(key) != "c":
+            assert after.owner(key) == before.owner(key)
+        else:
+            assert after.owner(key) in ("a", "b")
+
+
+def test_only_keys_taken_by_a_joining_member_move():
+
+    before = HashRing(["a", "b"])
+    after = HashRing(["a", "b", "c"])
+
+    moved = [key for key in KEYS if before.owner(key) != after.owner(key)]
+
+    assert moved
+    assert all(after.owner(key) == "c" for key in moved)
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from .work_queue import WorkQueue
+
+
+def test_add_dedupes_queued_keys():
+
+    queue = WorkQueue()
+    queue.add("a", priority=False)
+    queue.add("a", priority=False)
+    queue.add("b", priority=False)
+
+    assert len(queue) == 2
+    assert [queue.get(), queue.get()] == ["a", "b"]
+
+
+def test_priority_keys_are_served_first():
+
+    queue = WorkQueue()
+    queue.add("resync", priority=False)
+    queue.add("changed", priority=True)
+
+    assert queue.get() == "changed"
+    assert queue.get() == "resync"
+
+
+def test_priority_add_promotes_a_queued_resync():
+
+    queue = WorkQueue()
+    queue.add("a", priority=False)
+    queue.add("b", priority=False)
+    queue.add("b", priority=True)
+
+    # The stale resync entry left behind by the promotion is skipped
+    assert [queue.get(), queue.get()] == ["b", "a"]
+    assert len(queue) == 2
+
+    queue.done("a")
+    queue.done("b")
+    assert len(queue) == 0
+
+
+def test_key_being_processed_is_queued_again_once_done():
+
+    queue = WorkQueue()
+    queue.add("a")
+    assert queue.get() == "a"
+
+    # Not handed to a second worker while the first still holds it
+    queue.add("a", priority=False)
+    queue.add("a", priority=True)
+    assert len(queue) == 1
+
+    queue.done("a")
+    assert len(queue) == 1
+    assert queue.pending["a"][0] is True
+    assert queue.get() == "a"
+
+
+def test_retry_backs_off_exponentially_until_forgotten():
+
+    queue = WorkQueue(base_delay=1.0, max_delay=5.0)
+
+    assert [queue.retry("a") for _ in range(5)] == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+    queue.forget("a")
+    assert queue.retry("a") == 1.0
+
+
+def test_retried_key_is_served_after_its_delay():
+
+    queue = WorkQueue(base_delay=0.05)
+    queue.retry("a")
+
+    got = list()
+    worker = threading.Thread(target=lambda: got.append(queue.get()), daemon=True)
+
+    start = time.monotonic()
+    worker.start()
+    worker.join(timeout=5)
+
+    assert got == ["a"]
+    assert time.monotonic() - start >= 0.04
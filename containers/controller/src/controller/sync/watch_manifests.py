@@ -0,0 +1,22 @@
+import logging
+
+from ..kube import KubeObjectCache
+
+
+def watch_manifests(
+    namespaces: list = None,
+    label_selector: str = None,
+    limit: int = 500
+) -> KubeObjectCache:
+
+    logging.info(f"Watching kube manifests {namespaces=} {label_selector=}")
+    cache = KubeObjectCache(
+        group="guacamole.ukserp.ac.uk",
+        version="v1",
+        plural="guacamoleconnections",
+        namespaces=namespaces,
+        label_selector=label_selector,
+        limit=limit
+    )
+    cache.start()
+    return cache
@@ -0,0 +1,124 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import Counter, deque
+
+
+class WorkQueue:
+
+    base_delay: float
+    max_delay: float
+    condition: threading.Condition
+    sequence: itertools.count
+    queues: tuple
+    pending: dict
+    processing: set
+    dirty: dict
+    delayed: list
+    failures: Counter
+
+    def __init__(
+        self,
+        base_delay: float = 1.0,
+        max_delay: float = 300.0
+    ):
+
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.condition = threading.Condition()
+        self.sequence = itertools.count()
+
+        # Ready keys for changed manifests are served before ready keys for resyncs
+        self.queues = (deque(), deque())
+
+        # Key -> (priority, sequence) of every queued key, a promoted key leaves a stale
+        # entry behind in the resync queue which is skipped by its sequence number
+        self.pending = dict()
+
+        # Keys being reconciled by a worker, and the priority of any that were added
+        # again meanwhile so they are queued once the worker is done with them
+        self.processing = set()
+        self.dirty = dict()
+
+        # Heap of (ready time, sequence, key) waiting out a retry backoff
+        self.delayed = list()
+        self.failures = Counter()
+
+    def __len__(self) -> int:
+        with self.condition:
+            return len(self.pending) + len(self.processing) + len(self.delayed)
+
+    def add(self, key: str, priority: bool = True):
+
+        with self.condition:
+
+            # Never hand the same key to two workers, queue it again once it is done
+            if key in self.processing:
+                self.dirty[key] = self.dirty.get(key, False) or priority
+                return
+
+            if key in self.pending:
+
+                # Already queued, only a resync being overtaken by a change needs moving
+                if (not priority) or self.pending[key][0]:
+                    return
+
+            sequence = next(self.sequence)
+            self.pending[key] = (priority, sequence)
+            self.queues[0 if priority else 1].append((sequence, key))
+            self.condition.notify()
+
+    def add_after(self, key: str, delay: float):
+
+        with self.condition:
+            heapq.heappush(self.delayed, (time.monotonic() + delay, next(self.sequence), key))
+            self.condition.notify()
+
+    def retry(self, key: str) -> float:
+
+        # Exponential backoff per key, reset by forget once the key succeeds
+        with self.condition:
+            self.failures[key] += 1
+            delay = min(self.max_delay, self.base_delay * (2 ** (self.failures[key] - 1)))
+
+        self.add_after(key, delay)
+        return delay
+
+    def forget(self, key: str):
+        with self.condition:
+            self.failures.pop(key, None)
+
+    def get(self) -> str:
+
+        with self.condition:
+            while True:
+
+                # Keys whose backoff has passed rejoin the queue ahead of resyncs
+                now = time.monotonic()
+                while self.delayed and (self.delayed[0][0] <= now):
+                    _, _, key = heapq.heappop(self.delayed)
+                    self.add(key, priority=True)
+
+                for queue in self.queues:
+                    while queue:
+                        sequence, key = queue.popleft()
+
+                        if self.pending.get(key, (None, None))[1] != sequence:
+                            continue
+
+                        del self.pending[key]
+                        self.processing.add(key)
+                        return key
+
+                timeout = (self.delayed[0][0] - now) if self.delayed else None
+                self.condition.wait(timeout=timeout)
+
+    def done(self, key: str):
+
+        with self.condition:
+            self.processing.discard(key)
+
+            if key in self.dirty:
+                self.add(key, priority=self.dirty.pop(key))